@@ -16,18 +16,154 @@ Typical token cost per call:
 
 from __future__ import annotations
 
+import base64
 import ctypes
+import io
 import json
 import logging
-import re
-from typing import Any, Dict, List, Optional, Tuple
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence, Tuple
 
 import anthropic
+from PIL import Image
+
+# Optional local OCR prefilter — skips the Claude call entirely when the
+# screenshot clearly contains no Download button.  Needs the tesseract
+# binary plus pytesseract; without them every screenshot goes to the API
+# as before.
+try:
+    import pytesseract
+except ImportError:
+    pytesseract = None
+
+# Optional C JSON decoder for response parsing; raises a subclass of
+# json.JSONDecodeError, so the fallback handling below works unchanged.
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 log = logging.getLogger("dd_collector")
 
+
+def _loads(text: str) -> Any:
+    return orjson.loads(text) if orjson is not None else json.loads(text)
+
 DEFAULT_MODEL = "claude-haiku-4-5-20251001"
 
+# Max concurrent scan API calls.  Each call is a ~1-2s network round-trip, so
+# fanning out helps, but keep the fan-out modest to stay inside Anthropic
+# requests-per-minute limits.
+_MAX_PARALLEL_SCANS = 5
+
+# Entries kept in the per-instance duplicate-frame scan cache (LRU).
+_SCAN_CACHE_SIZE = 32
+
+# Single worker for debug screenshot writes so find_downloads never blocks
+# the API call on a base64 decode + disk write.
+_debug_io = ThreadPoolExecutor(max_workers=1)
+
+
+def _write_debug_screenshot(path: str, screenshot_b64: str) -> None:
+    try:
+        with open(path, "wb") as f:
+            f.write(base64.b64decode(screenshot_b64))
+        log.debug("Debug screenshot saved: %s", path)
+    except Exception as exc:
+        log.debug("Debug screenshot write failed (%s): %s", path, exc)
+
+# JPEG re-encode settings for the screenshot payload.  Chat panel screenshots
+# are UI renders with large uniform regions that compress 3-5x smaller as JPEG
+# than PNG with no practical loss for button/filename detection, and the long
+# edge is capped because Claude tiles images anyway — extra pixels only cost
+# upload time and image tokens.
+_JPEG_MAX_EDGE = 1024
+_JPEG_QUALITY = 80
+
+
+def _to_jpeg_b64(
+    png_b64: str,
+    quality: int = _JPEG_QUALITY,
+    max_edge: int = _JPEG_MAX_EDGE,
+) -> Optional[Tuple[str, float]]:
+    """Re-encode a base64 PNG screenshot as a downscaled base64 JPEG.
+
+    Flattens any alpha channel onto white, LANCZOS-resamples so the long
+    edge is at most *max_edge* pixels, and JPEG-encodes.
+
+    Returns:
+        (jpeg_b64, scale) where *scale* maps coordinates in the JPEG back
+        to the original image: original_x = jpeg_x * scale.
+        None on any decode/encode failure so the caller can fall back to
+        the original PNG payload.
+    """
+    try:
+        img = Image.open(io.BytesIO(base64.b64decode(png_b64)))
+        orig_w = img.width
+        if img.mode in ("RGBA", "LA", "P"):
+            # Flatten transparency on white (matches DingTalk's background)
+            img = img.convert("RGBA")
+            bg = Image.new("RGB", img.size, (255, 255, 255))
+            bg.paste(img, mask=img.split()[-1])
+            img = bg
+        else:
+            img = img.convert("RGB")
+        if max(img.size) > max_edge:
+            img.thumbnail((max_edge, max_edge), Image.LANCZOS)
+        buf = io.BytesIO()
+        img.save(buf, "JPEG", quality=quality, optimize=True)
+        scale = orig_w / img.width
+        return base64.b64encode(buf.getvalue()).decode("ascii"), scale
+    except Exception as exc:
+        log.warning("JPEG re-encode failed, sending original PNG: %s", exc)
+        return None
+
+
+def _dhash(png_b64: str) -> Optional[int]:
+    """64-bit difference hash of a screenshot for duplicate detection.
+
+    Consecutive scroll passes often produce pixel-identical (or nearly so)
+    frames — short chats hit the top and stop moving — and each one would
+    otherwise cost a full vision round-trip.  Grayscale 9x8 downscale +
+    adjacent-pixel comparison is robust to JPEG noise yet cheap (~1 ms).
+
+    Returns None on decode failure so callers just skip the cache.
+    """
+    try:
+        img = Image.open(io.BytesIO(base64.b64decode(png_b64)))
+        img = img.convert("L").resize((9, 8), Image.BILINEAR)
+        px = list(img.getdata())
+        bits = 0
+        for row in range(8):
+            for col in range(8):
+                i = row * 9 + col
+                bits = (bits << 1) | (px[i] < px[i + 1])
+        return bits
+    except Exception as exc:
+        log.debug("dhash failed (%s) — skipping scan cache", exc)
+        return None
+
+
+def _has_download_candidate(png_b64: str) -> bool:
+    """Cheap local check for Download/下载 text before spending an API call.
+
+    Text-only screens are common while scrolling, and each one otherwise
+    costs a full Claude round-trip that returns an empty list.  Errs on the
+    side of True: any OCR failure, timeout, or missing dependency means
+    "scan it anyway" — this is purely an optimisation, never a gate.
+    """
+    if pytesseract is None:
+        return True
+    try:
+        img = Image.open(io.BytesIO(base64.b64decode(png_b64))).convert("L")
+        text = pytesseract.image_to_string(img, lang="eng+chi_sim", timeout=0.3)
+    except Exception as exc:
+        log.debug("OCR prefilter failed (%s) — scanning anyway", exc)
+        return True
+    return "download" in text.lower() or "下载" in text
+
 
 def _get_screen_bounds() -> tuple:
     """Return (width, height) of the virtual screen (all monitors combined)."""
@@ -71,6 +207,39 @@ class ChatScanner:
     def __init__(self, api_key: str, model: str = DEFAULT_MODEL) -> None:
         self._client = anthropic.Anthropic(api_key=api_key)
         self._model = model
+        # Bounds in-flight API calls when find_downloads_batch fans out.
+        self._scan_sem = threading.Semaphore(_MAX_PARALLEL_SCANS)
+        # Memoized scan results keyed by (screenshot dhash, region offset):
+        # a repeated frame re-answers from here instead of the API.
+        self._scan_cache: "OrderedDict[tuple, List[Dict[str, Any]]]" = OrderedDict()
+        self._scan_cache_lock = threading.Lock()
+
+    def find_downloads_batch(
+        self,
+        items: Sequence[Tuple[str, Tuple[int, int]]],
+    ) -> List[List[Dict[str, Any]]]:
+        """Scan several screenshots concurrently.
+
+        Each screenshot still costs one API call, but the calls are
+        network-bound so a bounded thread pool gives near-linear speedup.
+        The ``anthropic.Anthropic`` client is thread-safe; the semaphore in
+        ``find_downloads`` keeps total concurrency within rate limits.
+
+        Args:
+            items: Sequence of ``(screenshot_b64, region_offset)`` pairs as
+                   accepted by ``find_downloads()``.
+
+        Returns:
+            One result list per input item, in the same order.
+        """
+        if not items:
+            return []
+        with ThreadPoolExecutor(max_workers=_MAX_PARALLEL_SCANS) as ex:
+            futures = [
+                ex.submit(self.find_downloads, b64, offset)
+                for b64, offset in items
+            ]
+            return [f.result() for f in futures]
 
     def find_downloads(
         self,
@@ -93,40 +262,87 @@ class ChatScanner:
             Coordinates are screen-absolute.  Empty list if none found or
             on any API error (logged as warning, never raises).
         """
-        # Optionally save the screenshot for debugging
-        if debug_save_path:
-            import base64 as _b64
-            with open(debug_save_path, "wb") as _f:
-                _f.write(_b64.b64decode(screenshot_b64))
-            log.debug("Debug screenshot saved: %s", debug_save_path)
+        # Optionally save the screenshot for debugging.  Skipped entirely
+        # unless debug logging is on; the decode + write runs on a background
+        # thread so the API call starts immediately.
+        if debug_save_path and log.isEnabledFor(logging.DEBUG):
+            _debug_io.submit(
+                _write_debug_screenshot, debug_save_path, screenshot_b64
+            )
+
+        # Duplicate-frame cache: identical screenshots of the same region
+        # always yield the same buttons, so answer repeats locally.
+        cache_key = None
+        frame_hash = _dhash(screenshot_b64)
+        if frame_hash is not None:
+            cache_key = (frame_hash, region_offset)
+            with self._scan_cache_lock:
+                if cache_key in self._scan_cache:
+                    self._scan_cache.move_to_end(cache_key)
+                    cached = self._scan_cache[cache_key]
+                    log.info(
+                        "ChatScanner: duplicate frame — reusing %d cached "
+                        "result(s)", len(cached),
+                    )
+                    return list(cached)
+
+        if not _has_download_candidate(screenshot_b64):
+            log.info("ChatScanner: OCR prefilter found no download text — skipping API call")
+            return []
+
+        # Re-encode as downscaled JPEG — ~60% fewer request bytes and image
+        # tokens per call than the raw PNG, with negligible detection impact.
+        encoded = _to_jpeg_b64(screenshot_b64)
+        if encoded is not None:
+            payload_b64, coord_scale = encoded
+            media_type = "image/jpeg"
+        else:
+            # Label the raw payload by its actual format — captures arrive
+            # as JPEG now, but older tools still hand over PNGs.
+            payload_b64, coord_scale = screenshot_b64, 1.0
+            media_type = (
+                "image/jpeg" if screenshot_b64.startswith("/9j/")
+                else "image/png"
+            )
 
         try:
-            response = self._client.messages.create(
-                model=self._model,
-                max_tokens=512,   # JSON-only response; 512 is generous
-                messages=[
-                    {
-                        "role": "user",
-                        "content": [
-                            {"type": "text", "text": _PROMPT},
-                            {
-                                "type": "image",
-                                "source": {
-                                    "type": "base64",
-                                    "media_type": "image/png",
-                                    "data": screenshot_b64,
+            with self._scan_sem:
+                response = self._client.messages.create(
+                    model=self._model,
+                    max_tokens=512,   # JSON-only response; 512 is generous
+                    messages=[
+                        {
+                            "role": "user",
+                            "content": [
+                                {
+                                    # The prompt is identical on every call, so let
+                                    # Anthropic cache it — repeat calls within the
+                                    # cache TTL bill the prefix at cache-read rates.
+                                    "type": "text",
+                                    "text": _PROMPT,
+                                    "cache_control": {"type": "ephemeral"},
                                 },
-                            },
-                        ],
-                    }
-                ],
-            )
+                                {
+                                    "type": "image",
+                                    "source": {
+                                        "type": "base64",
+                                        "media_type": media_type,
+                                        "data": payload_b64,
+                                    },
+                                },
+                            ],
+                        }
+                    ],
+                )
         except anthropic.APIError as exc:
             log.error("ChatScanner API error: %s", exc)
             return []
 
-        raw = "".join(
-            block.text for block in response.content if hasattr(block, "text")
+        # The scanner response carries exactly one text block; grab it
+        # directly instead of walking and joining every content block.
+        raw = next(
+            (b.text for b in response.content if getattr(b, "type", None) == "text"),
+            "",
         ).strip()
         log.debug("ChatScanner raw response (%d chars): %s", len(raw), raw[:300])
 
@@ -145,8 +361,10 @@ class ChatScanner:
         results: List[Dict[str, Any]] = []
         for item in files:
             try:
-                ax = int(item["x"]) + ox
-                ay = int(item["y"]) + oy
+                # Coordinates come back in JPEG pixel space; scale them up to
+                # the original screenshot before applying the screen offset.
+                ax = round(int(item["x"]) * coord_scale) + ox
+                ay = round(int(item["y"]) * coord_scale) + oy
                 if not (0 <= ax < screen_w and 0 <= ay < screen_h):
                     log.warning(
                         "ChatScanner: discarding out-of-bounds coord (%d, %d) "
@@ -165,32 +383,69 @@ class ChatScanner:
         log.info(
             "ChatScanner (%s): %d download button(s) found", self._model, len(results)
         )
+
+        if cache_key is not None:
+            with self._scan_cache_lock:
+                self._scan_cache[cache_key] = list(results)
+                self._scan_cache.move_to_end(cache_key)
+                while len(self._scan_cache) > _SCAN_CACHE_SIZE:
+                    self._scan_cache.popitem(last=False)
+
         return results
 
 
 # ── JSON extraction helper ────────────────────────────────────
 
 def _extract_json(text: str) -> Any:
-    """Parse JSON from text that may contain code fences or extra prose."""
+    """Parse JSON from text that may contain code fences or extra prose.
+
+    Pure scan-and-slice — no regex.  The common case (clean JSON, possibly
+    fenced) costs one slice and one ``json.loads``; prose-wrapped replies
+    fall back to a linear balanced-brace scan that skips string contents,
+    avoiding the backtracking risk of a DOTALL ``\\{.*\\}`` search on long
+    outputs.
+    """
     text = text.strip()
 
     # Strip markdown code fences: ```json ... ``` or ``` ... ```
-    text = re.sub(r"^```(?:json)?\s*\n?", "", text)
-    text = re.sub(r"\n?```\s*$", "", text)
-    text = text.strip()
+    if text.startswith("```"):
+        text = text[text.find("\n") + 1:]
+        if text.endswith("```"):
+            text = text[:-3]
+        text = text.strip()
 
     # Direct parse (happy path)
     try:
-        return json.loads(text)
+        return _loads(text)
     except json.JSONDecodeError:
         pass
 
-    # Find first {...} block in case there's surrounding prose
-    m = re.search(r"\{.*\}", text, re.DOTALL)
-    if m:
-        try:
-            return json.loads(m.group())
-        except json.JSONDecodeError:
-            pass
+    # Surrounding prose: scan for the first balanced {...} block,
+    # tracking string/escape state so braces inside strings don't count.
+    depth = 0
+    start = -1
+    in_str = False
+    esc = False
+    for i, c in enumerate(text):
+        if in_str:
+            if esc:
+                esc = False
+            elif c == "\\":
+                esc = True
+            elif c == '"':
+                in_str = False
+        elif c == '"':
+            in_str = True
+        elif c == "{":
+            if depth == 0:
+                start = i
+            depth += 1
+        elif c == "}" and depth > 0:
+            depth -= 1
+            if depth == 0 and start >= 0:
+                try:
+                    return _loads(text[start:i + 1])
+                except json.JSONDecodeError:
+                    start = -1
 
     return None
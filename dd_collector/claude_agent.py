@@ -6,24 +6,150 @@ full sequence can be replayed and analysed for improvement.
 
 from __future__ import annotations
 
+import atexit
 import base64
+import ctypes
+import hashlib
 import io
 import json
 import logging
 import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Any, Dict, List, Optional
-
-import anthropic
-import mss
-import mss.tools
-import pyautogui
+from typing import Any, Dict, List, Optional, Tuple
+
+# Heavy third-party deps (anthropic pulls httpx + pydantic; pyautogui
+# pulls pywin32, PIL and friends — hundreds of ms combined) are imported
+# in ClaudeAgent.__init__ rather than at module scope, so importing this
+# module — which run_claude.py always does — stays cheap for the modes
+# that never construct the agent.  Placeholders keep NameError away from
+# any accidental pre-init use.
+anthropic = mss = pyautogui = Image = None
+pyspng = np = pyperclip = win32clipboard = None
+
+# Optional C JSON encoder for per-action logging/serialization
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 log = logging.getLogger("dd_collector")
 
+
+def _dumps(obj: Any) -> str:
+    """Serialize for logs — orjson when available, stdlib otherwise."""
+    if orjson is not None:
+        return orjson.dumps(obj).decode("utf-8")
+    return json.dumps(obj, ensure_ascii=False)
+
+# zlib level for the mss PNG fallback.  Replay PNGs are write-once debug
+# artifacts; level 1 encodes several times faster than the default 6 for a
+# modestly larger file.
+_PNG_COMPRESS_LEVEL = 1
+
+
+def _encode_png(raw: "mss.screenshot.ScreenShot") -> bytes:
+    """Encode an mss grab as PNG, via pyspng when available."""
+    if pyspng is not None:
+        arr = np.frombuffer(raw.rgb, dtype=np.uint8).reshape(
+            raw.size.height, raw.size.width, 3
+        )
+        return pyspng.encode(arr, compress_level=_PNG_COMPRESS_LEVEL)
+    return mss.tools.to_png(raw.rgb, raw.size, level=_PNG_COMPRESS_LEVEL)
+
 # Safety cap: agent stops after this many API round-trips per group
 MAX_ITERATIONS = 60
 
+# API screenshots are downscaled JPEGs — a full-res PNG of a 2560x1440 screen
+# is 3-8 MB per iteration, and upload bytes + image tokens dominate per-turn
+# cost.  The lossless PNG is still written to the session dir for replay.
+# Claude sees (and returns coordinates in) the downscaled space; the agent
+# scales coordinates back to real screen pixels before acting.  Defaults,
+# overridable via claude.screenshot_max_edge / claude.screenshot_jpeg_quality
+# in config.yaml.
+_SCREENSHOT_MAX_EDGE = 1280
+_SCREENSHOT_JPEG_QUALITY = 75
+
+# Claude key names → pyautogui key names.  Module-level so "key" actions
+# don't rebuild the table on every press.
+_KEY_MAP = {
+    "return": "enter", "super": "win", "ctrl": "ctrl",
+    "alt": "alt", "shift": "shift", "escape": "escape",
+    "esc": "escape", "backspace": "backspace", "tab": "tab",
+    "delete": "delete", "del": "delete",
+    "page_up": "pageup", "page_down": "pagedown",
+    "home": "home", "end": "end",
+    "up": "up", "down": "down", "left": "left", "right": "right",
+}
+
+# Extra settle time (seconds) before the post-action screenshot, per action.
+# Handlers already wait for their own effects, so most actions need none;
+# pointer/key actions get a short top-up for menus and dialogs still
+# rendering when the adaptive wait returns early.  Replaces the old
+# unconditional 0.5 s sleep that stacked on top of every handler's wait.
+_SETTLE_HINTS = {
+    "left_click": 0.2, "right_click": 0.2, "double_click": 0.2,
+    "middle_click": 0.2, "left_click_drag": 0.2,
+    "type": 0.2, "key": 0.2,
+}
+
+# Static portion of the task prompt.  Kept free of per-run variables so the
+# whole block can carry a cache_control breakpoint: every iteration of the
+# agent loop (and every group in the same session) then reads these tokens
+# at cache rates instead of full input pricing.  Group name, the list of
+# already-downloaded files, scroll count and download dir go in a separate
+# uncached tail block.
+_STATIC_INSTRUCTIONS = (
+    "You are automating the DingTalk (钉钉) PC application on Windows "
+    "to download files from a group chat.\n\n"
+    "STEP-BY-STEP INSTRUCTIONS:\n"
+    "1. Take a screenshot to see the current screen state.\n"
+    "2. Find the DingTalk window. If minimized, click its taskbar button.\n"
+    "3. Navigate to the target group (named in the TASK section below):\n"
+    "   a. Look in the left sidebar for the group name and click it.\n"
+    "   b. If not visible: click the search box at the TOP of the sidebar,\n"
+    "      type the group name, then click the matching result.\n"
+    "   c. If a full-screen search overlay appears, press Escape and retry.\n"
+    "4. Once the group chat is open, scan for TWO types of downloadable content:\n"
+    "   TYPE A — File attachment cards (PDF, XLSX, DOCX, etc.):\n"
+    "   - Cards show: file icon + filename + file size + Download (下载) button.\n"
+    "   - Hover over a card to reveal the Download button if not visible.\n"
+    "   - Click the Download button directly.\n"
+    "   TYPE B — Inline images / screenshots shared in chat:\n"
+    "   - These appear as image thumbnails or previews in the chat.\n"
+    "   - To download: RIGHT-CLICK on the image → select 'Save As' or '另存为'\n"
+    "     or '下载' from the context menu → click Save in the dialog.\n"
+    "   - The filename shown in the Save As dialog is the actual filename to check\n"
+    "     against the already-downloaded list.\n"
+    "5. For each NEW item (not in the already-downloaded list):\n"
+    "   a. File card: click its Download (下载) button.\n"
+    "   b. Inline image: right-click → Save As / 另存为 / 下载 → Save.\n"
+    "   c. FILENAME RULE — When the Save As dialog appears, rename the file\n"
+    "      to include the message's upload timestamp before saving:\n"
+    "      - Note the timestamp shown on the chat message (e.g. '02/26 17:30')\n"
+    "        BEFORE you click Download / right-click the image.\n"
+    "      - In the Save As dialog: triple-click the filename field to select all,\n"
+    "        then type the new name in this format:\n"
+    "        {original_name}_{YYYY-MM-DD_HH-mm}{extension}\n"
+    "        Examples:\n"
+    "          '路透晚报.pdf'  uploaded at '02/26 17:30'  →  '路透晚报_2026-02-26_17-30.pdf'\n"
+    "          'IMG_1234.jpg'  uploaded at '02/23 15:21'  →  'IMG_1234_2026-02-23_15-21.jpg'\n"
+    "        Convert DingTalk date '02/26' using current year (2026).\n"
+    "        Use hyphens in the time part (17-30 not 17:30) so it is filename-safe.\n"
+    "        If the timestamp says 'Yesterday' use today's date minus one day.\n"
+    "        If the timestamp says 'Today' use today's date.\n"
+    "      - Then click Save.\n"
+    "   d. Wait 1-2 seconds after each download.\n"
+    "6. Scroll UP in the chat to see older messages. Repeat for the number of\n"
+    "   screens given in the TASK section below.\n"
+    "7. When all visible content has been processed, say: TASK COMPLETE\n\n"
+    "NOTES:\n"
+    "- '下载' means Download, '另存为' means Save As in Chinese.\n"
+    "- Do NOT open the Files tab — only scan chat messages.\n"
+    "- If an update/notification dialog appears, dismiss it first "
+    "  (click 'Later', '稍后', 'Cancel', '取消', or press Escape)."
+)
+
 
 class ClaudeAgent:
     """Autonomous agent using Claude's computer use API (computer_20250124).
@@ -38,7 +164,38 @@ class ClaudeAgent:
         model: str = "claude-opus-4-5-20251101",
         log_dir: str = "logs",
         base_url: Optional[str] = None,
+        screenshot_max_edge: int = _SCREENSHOT_MAX_EDGE,
+        screenshot_jpeg_quality: int = _SCREENSHOT_JPEG_QUALITY,
+        capture_window_only: bool = False,
+        window_class: str = "StandardFrame_DingTalk",
     ) -> None:
+        global anthropic, mss, pyautogui, Image, pyspng, np, pyperclip
+        global win32clipboard
+        import anthropic
+        import httpx
+        import mss
+        import mss.tools
+        import pyautogui
+        from PIL import Image
+        # Optional extras: pyspng is a SIMD PNG encoder (~10x faster than
+        # zlib paths for the replay PNGs); pyperclip makes "type" actions
+        # paste instead of keystroke-by-keystroke.
+        try:
+            import numpy as np
+            import pyspng
+        except ImportError:
+            pass
+        try:
+            import pyperclip
+        except ImportError:
+            pass
+        # win32clipboard (pywin32) writes the clipboard in-process; some
+        # pyperclip configurations shell out to clip.exe per copy.
+        try:
+            import win32clipboard
+        except ImportError:
+            pass
+
         if oauth_token.startswith("sk-ant-oat"):
             raise ValueError(
                 "The provided token is a Claude Code OAuth token (sk-ant-oat01-…), "
@@ -50,8 +207,26 @@ class ClaudeAgent:
         if base_url:
             kwargs["base_url"] = base_url
             log.info("ClaudeAgent base_url: %s", base_url)
+        # Warm connection pool for the tight per-iteration call loop:
+        # keep-alive across all iterations and groups, transport-level
+        # retries for flaky handshakes, and HTTP/2 when h2 is installed.
+        try:
+            import h2  # noqa: F401 — presence check only
+            http2 = True
+        except ImportError:
+            http2 = False
+        kwargs["http_client"] = httpx.Client(
+            timeout=60,
+            transport=httpx.HTTPTransport(
+                http2=http2,
+                retries=2,
+                limits=httpx.Limits(max_keepalive_connections=4),
+            ),
+        )
         self._client = anthropic.Anthropic(**kwargs)
         self._model = model
+        self._shot_max_edge = screenshot_max_edge
+        self._shot_quality = screenshot_jpeg_quality
 
         # Per-session log directory: logs/autonomous/YYYYMMDD_HHMMSS/
         ts = time.strftime("%Y%m%d_%H%M%S")
@@ -62,132 +237,431 @@ class ClaudeAgent:
 
         self._screenshot_idx = 0
         self._current_group = "run"
+        # Action log: opened once for the session and flushed in batches, so
+        # a crash mid-run loses at most a handful of actions instead of all
+        # of them, without a per-action open/close syscall pair.
         self._action_log: List[Dict[str, Any]] = []
+        self._action_fp = open(
+            self._session_dir / "actions.jsonl", "a", encoding="utf-8"
+        )
+        atexit.register(self._close_action_log)
+        # Background writer for replay PNGs — keeps multi-MB disk writes off
+        # the critical path between capture and the next API call.
+        self._io_pool = ThreadPoolExecutor(max_workers=2)
+        # Frame captured while the API response streams in; valid for a
+        # "screenshot" action (no action has run since), stale once
+        # anything executes.
+        self._pending_shot: Optional[str] = None
+        # Reused JPEG encode buffer — avoids allocating a fresh BytesIO per
+        # screenshot over a 60-iteration run.
+        self._jpeg_buf = io.BytesIO()
+        # Persistent mss grabber: allocates the BitBlt/DC handles once
+        # instead of on every capture.  monitors[1] = primary display.
+        self._sct = mss.mss()
+        self._monitor = self._sct.monitors[1]
+        # Optional region-of-interest capture: grab only the DingTalk
+        # window rect instead of the whole desktop — fewer pixels through
+        # the encode/upload/vision pipeline.  Off by default because the
+        # agent sometimes needs full-screen context (taskbar, dialogs).
+        self._capture_window_only = capture_window_only
+        self._window_class = window_class
+        self._roi: Optional[Dict[str, int]] = None
+        # Hash of the last captured JPEG — lets the agent loop detect that
+        # an action left the screen pixel-identical and skip re-uploading
+        # the frame.  blake2b is the fastest stdlib hash for this.
+        self._last_shot_hash: Optional[bytes] = None
+        self._last_shot_changed = True
+        # Multiplier from Claude's (downscaled) screenshot space to real
+        # screen pixels; refreshed on every capture.
+        self._coord_scale = 1.0
+        # Action dispatch table — built once instead of walking an if/elif
+        # chain per action in the agent loop.
+        self._handlers: Dict[str, Any] = {
+            "screenshot": self._do_screenshot,
+            "left_click": self._do_click,
+            "right_click": self._do_click,
+            "double_click": self._do_click,
+            "middle_click": self._do_click,
+            "mouse_move": self._do_click,
+            "left_click_drag": self._do_drag,
+            "type": self._do_type,
+            "key": self._do_key,
+            "scroll": self._do_scroll,
+            "cursor_position": self._do_cursor_position,
+            "hold_key": self._do_hold_key,
+        }
+
+    def __del__(self) -> None:
+        try:
+            self._sct.close()
+        except Exception:
+            pass
 
     # ── Screenshot helper ────────────────────────────────────────
 
     def _take_screenshot(self) -> str:
-        """Capture full screen via mss (works with CefBrowserWindow), save PNG, return base64."""
-        with mss.mss() as sct:
-            raw = sct.grab(sct.monitors[1])  # monitor[1] = primary display
-            png_bytes = mss.tools.to_png(raw.rgb, raw.size)
+        """Capture full screen via mss (works with CefBrowserWindow).
 
-        b64 = base64.standard_b64encode(png_bytes).decode("utf-8")
+        Saves the lossless PNG to the session dir for replay, but returns
+        base64 of a downscaled JPEG — 5-10x fewer uploaded bytes and image
+        tokens per agent turn.  Updates ``self._coord_scale`` so action
+        coordinates can be mapped back to real screen pixels.
+        """
+        raw = self._sct.grab(self._roi or self._monitor)
+        png_bytes = _encode_png(raw)
+        # frombuffer gives a zero-copy view over the RGB buffer (frombytes
+        # would copy the full ~3 MB frame); thumbnail/save only read it.
+        img = Image.frombuffer("RGB", raw.size, raw.rgb, "raw", "RGB", 0, 1)
+
+        orig_w = img.width
+        edge = self._shot_max_edge
+        if img.width > edge or img.height > edge:
+            img.thumbnail((edge, edge), Image.LANCZOS)
+        self._coord_scale = orig_w / img.width
+
+        self._jpeg_buf.seek(0)
+        self._jpeg_buf.truncate(0)
+        img.save(self._jpeg_buf, "JPEG", quality=self._shot_quality)
+        jpeg_bytes = self._jpeg_buf.getvalue()
+        b64 = base64.standard_b64encode(jpeg_bytes).decode("utf-8")
+
+        digest = hashlib.blake2b(jpeg_bytes).digest()
+        self._last_shot_changed = digest != self._last_shot_hash
+        self._last_shot_hash = digest
 
         safe_name = self._current_group.replace("/", "_").replace("\\", "_")
         fname = f"{safe_name}_{self._screenshot_idx:04d}.png"
         path = self._session_dir / fname
-        path.write_bytes(png_bytes)
-        log.info("  [screenshot %04d] saved → %s", self._screenshot_idx, path.name)
+        self._io_pool.submit(path.write_bytes, png_bytes)
+        log.info("  [screenshot %04d] saving → %s", self._screenshot_idx, path.name)
         self._screenshot_idx += 1
 
         return b64
 
+    def _to_screen(self, coord: Any) -> Tuple[int, int]:
+        """Map a coordinate from screenshot space to real screen pixels."""
+        s = self._coord_scale
+        ox = self._roi["left"] if self._roi else 0
+        oy = self._roi["top"] if self._roi else 0
+        return int(round(coord[0] * s)) + ox, int(round(coord[1] * s)) + oy
+
+    def _locate_roi(self) -> None:
+        """Set the capture region to the DingTalk window rect, if findable.
+
+        Falls back to full-screen capture when the window is missing or
+        the rect looks degenerate (minimized windows report offscreen
+        positions).
+        """
+        self._roi = None
+        try:
+            from ctypes import wintypes
+            user32 = ctypes.windll.user32
+            hwnd = user32.FindWindowW(self._window_class, None)
+            if not hwnd:
+                return
+            rect = wintypes.RECT()
+            if not user32.GetWindowRect(hwnd, ctypes.byref(rect)):
+                return
+            w, h = rect.right - rect.left, rect.bottom - rect.top
+            if w >= 400 and h >= 300 and rect.left > -10000:
+                self._roi = {
+                    "left": rect.left, "top": rect.top,
+                    "width": w, "height": h,
+                }
+                log.info(
+                    "Capture ROI: DingTalk window %dx%d at (%d, %d)",
+                    w, h, rect.left, rect.top,
+                )
+        except Exception as exc:
+            log.debug("ROI lookup failed (%s) — using full-screen capture", exc)
+
+    # ── History trimming ─────────────────────────────────────────
+
+    # Turn pairs (assistant + tool_result) that keep their screenshots.
+    _HISTORY_KEEP_TURNS = 4
+
+    def _trim_old_screenshots(self, messages: List[Dict[str, Any]]) -> None:
+        """Replace screenshots in old turns with a small text placeholder.
+
+        The full history is resent on every API call, so without trimming
+        the request body grows by one multi-hundred-KB image per iteration
+        — O(iterations²) bytes uploaded in total.  Only the initial task
+        message and the last ``_HISTORY_KEEP_TURNS`` turn pairs keep their
+        images; tool_use_id references stay intact so the conversation
+        remains valid.  Idempotent — already-trimmed turns are left alone.
+        """
+        cutoff = len(messages) - 2 * self._HISTORY_KEEP_TURNS
+        if cutoff <= 1:
+            return
+
+        trimmed = 0
+        for msg in messages[1:cutoff]:
+            # Images only live in user turns (tool_results); assistant turns
+            # hold SDK content blocks with no images.
+            if msg.get("role") != "user":
+                continue
+            content = msg.get("content")
+            if not isinstance(content, list):
+                continue
+            for block in content:
+                if not (isinstance(block, dict) and block.get("type") == "tool_result"):
+                    continue
+                inner = block.get("content")
+                if not isinstance(inner, list):
+                    continue
+                for j, item in enumerate(inner):
+                    if isinstance(item, dict) and item.get("type") == "image":
+                        inner[j] = {
+                            "type": "text",
+                            "text": "[screenshot omitted — superseded by later frames]",
+                        }
+                        trimmed += 1
+
+        if trimmed:
+            log.debug("History trim: %d old screenshot(s) replaced.", trimmed)
+
+    # ── Action log ───────────────────────────────────────────────
+
+    # Buffered actions are written out once this many accumulate.
+    _ACTION_FLUSH_EVERY = 10
+
+    def _flush_action_log(self) -> None:
+        """Write buffered action entries to the session log and clear them."""
+        if not self._action_log:
+            return
+        for entry in self._action_log:
+            self._action_fp.write(_dumps(entry) + "\n")
+        self._action_fp.flush()
+        self._action_log.clear()
+
+    def _close_action_log(self) -> None:
+        try:
+            self._flush_action_log()
+            self._action_fp.close()
+        except Exception:
+            pass
+
     # ── Action execution ─────────────────────────────────────────
 
-    def _execute_action(self, action: Dict[str, Any]) -> Optional[str]:
-        """Execute one computer-use action. Returns base64 screenshot or None."""
+    def _wait_for_stable_screen(
+        self, max_s: float = 0.4, interval: float = 0.05
+    ) -> None:
+        """Wait until two consecutive grabs hash identically, up to *max_s*.
+
+        Most actions settle near-instantly; the fixed post-action sleeps
+        were sized for the worst case.  Hashing the raw grab (no encode)
+        every 50 ms exits as soon as the screen stops changing, keeping
+        the worst-case ceiling but cutting the average wait to ~60 ms.
+        """
+        deadline = time.monotonic() + max_s
+        prev: Optional[bytes] = None
+        while time.monotonic() < deadline:
+            raw = self._sct.grab(self._roi or self._monitor)
+            digest = hashlib.blake2b(raw.raw).digest()
+            if digest == prev:
+                return
+            prev = digest
+            time.sleep(interval)
+
+    def _execute_action(self, action: Dict[str, Any]) -> Tuple[Optional[str], float]:
+        """Execute one computer-use action.
+
+        Returns ``(result, settle)`` — *result* is a base64 screenshot, a
+        cursor-position string, or None; *settle* is the extra wait (s) the
+        caller should allow before taking the follow-up screenshot.
+        """
         act = action.get("action", "")
-        coord = action.get("coordinate", [0, 0])
 
         # Log full action at INFO so it appears in run_claude.log
-        log.info("  [action] %s | %s", act, json.dumps(
-            {k: v for k, v in action.items() if k != "action"}, ensure_ascii=False
+        log.info("  [action] %s | %s", act, _dumps(
+            {k: v for k, v in action.items() if k != "action"}
         ))
         self._action_log.append({"group": self._current_group, "action": action})
+        if len(self._action_log) >= self._ACTION_FLUSH_EVERY:
+            self._flush_action_log()
+
+        if act != "screenshot":
+            # Any real action invalidates a frame captured during the API wait
+            self._pending_shot = None
+
+        handler = self._handlers.get(act)
+        if handler is None:
+            log.warning("  [action] unknown action type: %r", act)
+            return None, 0.0
+        return handler(action), _SETTLE_HINTS.get(act, 0.0)
+
+    def _do_screenshot(self, action: Dict[str, Any]) -> Optional[str]:
+        # Serve the frame prefetched during the API wait when one is still
+        # valid — nothing has acted on the screen since it was grabbed.
+        shot, self._pending_shot = self._pending_shot, None
+        return shot if shot is not None else self._take_screenshot()
+
+    def _do_click(self, action: Dict[str, Any]) -> Optional[str]:
+        act = action["action"]
+        x, y = self._to_screen(action.get("coordinate", [0, 0]))
+        if act == "left_click":
+            pyautogui.click(x, y, button="left")
+        elif act == "right_click":
+            pyautogui.click(x, y, button="right")
+        elif act == "double_click":
+            pyautogui.doubleClick(x, y)
+        elif act == "middle_click":
+            pyautogui.click(x, y, button="middle")
+        elif act == "mouse_move":
+            pyautogui.moveTo(x, y)
+        self._wait_for_stable_screen(0.4)
+        return None
 
-        if act == "screenshot":
-            return self._take_screenshot()
-
-        if act in ("left_click", "right_click", "double_click", "mouse_move", "middle_click"):
-            x, y = int(coord[0]), int(coord[1])
-            if act == "left_click":
-                pyautogui.click(x, y, button="left")
-            elif act == "right_click":
-                pyautogui.click(x, y, button="right")
-            elif act == "double_click":
-                pyautogui.doubleClick(x, y)
-            elif act == "middle_click":
-                pyautogui.click(x, y, button="middle")
-            elif act == "mouse_move":
-                pyautogui.moveTo(x, y)
-            time.sleep(0.4)
-            return None
-
-        if act == "left_click_drag":
-            start = action.get("start_coordinate", [0, 0])
-            end = coord
-            pyautogui.mouseDown(int(start[0]), int(start[1]))
-            time.sleep(0.1)
-            pyautogui.dragTo(int(end[0]), int(end[1]), duration=0.3, button="left")
-            pyautogui.mouseUp()
-            time.sleep(0.4)
-            return None
-
-        if act == "type":
-            text = action.get("text", "")
-            log.info("    text=%r", text[:80])
+    def _do_drag(self, action: Dict[str, Any]) -> Optional[str]:
+        sx, sy = self._to_screen(action.get("start_coordinate", [0, 0]))
+        ex, ey = self._to_screen(action.get("coordinate", [0, 0]))
+        pyautogui.mouseDown(sx, sy)
+        time.sleep(0.1)
+        pyautogui.dragTo(ex, ey, duration=0.3, button="left")
+        pyautogui.mouseUp()
+        self._wait_for_stable_screen(0.4)
+        return None
+
+    def _do_type(self, action: Dict[str, Any]) -> Optional[str]:
+        text = action.get("text", "")
+        log.info("    text=%r", text[:80])
+        try:
+            self._set_clipboard(text)
+            pyautogui.hotkey("ctrl", "v")
+        except Exception:
+            pyautogui.typewrite(text, interval=0.05)
+        self._wait_for_stable_screen(0.3)
+        return None
+
+    @staticmethod
+    def _set_clipboard(text: str) -> None:
+        """Put *text* on the clipboard, preferring the direct Win32 call."""
+        if win32clipboard is not None:
+            win32clipboard.OpenClipboard()
             try:
-                import pyperclip
-                pyperclip.copy(text)
-                pyautogui.hotkey("ctrl", "v")
-            except Exception:
-                pyautogui.typewrite(text, interval=0.05)
-            time.sleep(0.3)
-            return None
-
-        if act == "key":
-            # Both "key" and legacy "text" field names
-            key_str = action.get("key", action.get("text", "")).strip()
-            log.info("    key=%r", key_str)
-            key_map = {
-                "return": "enter", "super": "win", "ctrl": "ctrl",
-                "alt": "alt", "shift": "shift", "escape": "escape",
-                "esc": "escape", "backspace": "backspace", "tab": "tab",
-                "delete": "delete", "del": "delete",
-                "page_up": "pageup", "page_down": "pagedown",
-                "home": "home", "end": "end",
-                "up": "up", "down": "down", "left": "left", "right": "right",
+                win32clipboard.EmptyClipboard()
+                win32clipboard.SetClipboardData(
+                    win32clipboard.CF_UNICODETEXT, text
+                )
+            finally:
+                win32clipboard.CloseClipboard()
+        else:
+            pyperclip.copy(text)
+
+    def _do_key(self, action: Dict[str, Any]) -> Optional[str]:
+        # Both "key" and legacy "text" field names
+        key_str = action.get("key", action.get("text", "")).strip()
+        log.info("    key=%r", key_str)
+        parts = [_KEY_MAP.get(p.lower(), p.lower()) for p in key_str.split("+")]
+        if len(parts) == 1:
+            pyautogui.press(parts[0])
+        else:
+            pyautogui.hotkey(*parts)
+        self._wait_for_stable_screen(0.3)
+        return None
+
+    def _do_scroll(self, action: Dict[str, Any]) -> Optional[str]:
+        x, y = self._to_screen(action.get("coordinate", [0, 0]))
+        # Support both computer_20241022 (direction/amount) and computer_20250124 (scroll_direction/scroll_amount)
+        direction = action.get("direction") or action.get("scroll_direction", "down")
+        amount = int(action.get("amount") or action.get("scroll_amount", 3))
+        if direction == "down":
+            pyautogui.scroll(-amount, x=x, y=y)
+        elif direction == "up":
+            pyautogui.scroll(amount, x=x, y=y)
+        elif direction == "right":
+            pyautogui.hscroll(amount, x=x, y=y)
+        elif direction == "left":
+            pyautogui.hscroll(-amount, x=x, y=y)
+        self._wait_for_stable_screen(0.5)
+        return None
+
+    def _do_cursor_position(self, action: Dict[str, Any]) -> Optional[str]:
+        sx, sy = pyautogui.position()
+        # Report in screenshot space — the space Claude reasons in
+        s = self._coord_scale
+        ox = self._roi["left"] if self._roi else 0
+        oy = self._roi["top"] if self._roi else 0
+        return f"Cursor at ({int(round((sx - ox) / s))}, {int(round((sy - oy) / s))})"
+
+    def _do_hold_key(self, action: Dict[str, Any]) -> Optional[str]:
+        key_str = action.get("key", action.get("text", ""))
+        duration = float(action.get("duration", 0.5))
+        pyautogui.keyDown(key_str)
+        time.sleep(duration)
+        pyautogui.keyUp(key_str)
+        time.sleep(0.2)
+        return None
+
+    def _run_tool_use(self, block: Any, will_follow: bool = False) -> Dict[str, Any]:
+        """Execute one tool_use block and build its tool_result message.
+
+        *will_follow* marks an action with more actions from the same
+        response queued right behind it.  Chained actions skip the settle
+        wait and post-action screenshot — only the run's final action pays
+        for a frame, the rest answer with a one-word acknowledgement.
+        """
+        if block.name != "computer":
+            log.warning("ClaudeAgent: unexpected tool name=%r", block.name)
+            return {
+                "type": "tool_result",
+                "tool_use_id": block.id,
+                "content": [{"type": "text", "text": f"Unknown tool: {block.name}"}],
+                "is_error": True,
             }
-            parts = [key_map.get(p.lower(), p.lower()) for p in key_str.split("+")]
-            if len(parts) == 1:
-                pyautogui.press(parts[0])
+
+        result, settle = self._execute_action(block.input)
+
+        if result is None or (isinstance(result, str) and result.startswith("Cursor")):
+            if will_follow:
+                return {
+                    "type": "tool_result",
+                    "tool_use_id": block.id,
+                    "content": [{"type": "text", "text": result or "ok"}],
+                }
+            # Take a fresh screenshot after the action; handlers already
+            # waited, so only top up where hinted.
+            if settle:
+                time.sleep(settle)
+            screenshot_b64 = self._take_screenshot()
+            if self._last_shot_changed:
+                content: Any = [
+                    {
+                        "type": "image",
+                        "source": {
+                            "type": "base64",
+                            "media_type": "image/jpeg",
+                            "data": screenshot_b64,
+                        },
+                    }
+                ]
             else:
-                pyautogui.hotkey(*parts)
-            time.sleep(0.3)
-            return None
-
-        if act == "scroll":
-            x, y = int(coord[0]), int(coord[1])
-            # Support both computer_20241022 (direction/amount) and computer_20250124 (scroll_direction/scroll_amount)
-            direction = action.get("direction") or action.get("scroll_direction", "down")
-            amount = int(action.get("amount") or action.get("scroll_amount", 3))
-            if direction == "down":
-                pyautogui.scroll(-amount, x=x, y=y)
-            elif direction == "up":
-                pyautogui.scroll(amount, x=x, y=y)
-            elif direction == "right":
-                pyautogui.hscroll(amount, x=x, y=y)
-            elif direction == "left":
-                pyautogui.hscroll(-amount, x=x, y=y)
-            time.sleep(0.5)
-            return None
-
-        if act == "cursor_position":
-            x, y = pyautogui.position()
-            return f"Cursor at ({x}, {y})"
-
-        if act == "hold_key":
-            key_str = action.get("key", action.get("text", ""))
-            duration = float(action.get("duration", 0.5))
-            pyautogui.keyDown(key_str)
-            time.sleep(duration)
-            pyautogui.keyUp(key_str)
-            time.sleep(0.2)
-            return None
-
-        log.warning("  [action] unknown action type: %r", act)
-        return None
+                # Pixel-identical to the previous frame — a short note
+                # costs a handful of tokens instead of an image re-upload.
+                content = [{
+                    "type": "text",
+                    "text": "(screen unchanged since the previous screenshot)",
+                }]
+            if result and result.startswith("Cursor"):
+                content.insert(0, {"type": "text", "text": result})
+        else:
+            # result is already a screenshot base64
+            content = [
+                {
+                    "type": "image",
+                    "source": {
+                        "type": "base64",
+                        "media_type": "image/jpeg",
+                        "data": result,
+                    },
+                }
+            ]
+
+        return {
+            "type": "tool_result",
+            "tool_use_id": block.id,
+            "content": content,
+        }
 
     # ── Main agent loop ──────────────────────────────────────────
 
@@ -206,78 +680,63 @@ class ClaudeAgent:
         """
         self._current_group = group_name
         self._screenshot_idx = 0
-
-        # Dynamic screen resolution
-        screen_w, screen_h = pyautogui.size()
+        self._last_shot_hash = None  # first capture of a task always uploads
+
+        # Dynamic screen resolution.  The tool advertises the downscaled
+        # screenshot dimensions — the space Claude actually sees and returns
+        # coordinates in; _to_screen() maps its clicks back to real pixels.
+        if self._capture_window_only:
+            self._locate_roi()
+        if self._roi:
+            screen_w, screen_h = self._roi["width"], self._roi["height"]
+        else:
+            screen_w, screen_h = pyautogui.size()
+        scale = min(
+            1.0,
+            self._shot_max_edge / screen_w,
+            self._shot_max_edge / screen_h,
+        )
+        disp_w, disp_h = round(screen_w * scale), round(screen_h * scale)
         log.info(
-            "ClaudeAgent.run_download_task: group=%r model=%s screen=%dx%d",
-            group_name, self._model, screen_w, screen_h,
+            "ClaudeAgent.run_download_task: group=%r model=%s screen=%dx%d display=%dx%d",
+            group_name, self._model, screen_w, screen_h, disp_w, disp_h,
         )
 
         computer_tool: Dict[str, Any] = {
             "type": "computer_20250124",
             "name": "computer",
-            "display_width_px": screen_w,
-            "display_height_px": screen_h,
+            "display_width_px": disp_w,
+            "display_height_px": disp_h,
+            # Cache breakpoint after the tool definition so the tool schema
+            # joins the static-instructions prefix in the prompt cache.
+            "cache_control": {"type": "ephemeral"},
         }
 
-        already_str = (
-            "\n".join(f"  - {f}" for f in already_downloaded[:50])
-            if already_downloaded else "  (none)"
-        )
+        # Compact one-line fingerprint: comma-joined, long names truncated.
+        # A 40-char prefix is plenty to discriminate filenames, and the
+        # single line costs ~3x fewer tokens than a bullet list.  The list
+        # is recorded oldest-first, so keep the newest 50 — those are the
+        # files Claude will actually see in the recent messages.
+        if already_downloaded:
+            recent = already_downloaded[-50:]
+            already_str = ", ".join(
+                f if len(f) <= 40 else f[:40] + "…" for f in recent
+            )
+            if len(already_downloaded) > len(recent):
+                already_str += (
+                    f" (plus {len(already_downloaded) - len(recent)} earlier files)"
+                )
+        else:
+            already_str = "(none)"
 
-        task_prompt = (
-            f"You are automating the DingTalk (钉钉) PC application on Windows "
-            f"to download files from a group chat.\n\n"
+        # Volatile per-run details live in their own text block so they don't
+        # invalidate the cached static-instructions prefix.
+        dynamic_tail = (
             f"TASK: Download all NEW files from DingTalk group \"{group_name}\".\n\n"
-            f"FILES ALREADY DOWNLOADED (skip these):\n{already_str}\n\n"
-            f"STEP-BY-STEP INSTRUCTIONS:\n"
-            f"1. Take a screenshot to see the current screen state.\n"
-            f"2. Find the DingTalk window. If minimized, click its taskbar button.\n"
-            f"3. Navigate to group \"{group_name}\":\n"
-            f"   a. Look in the left sidebar for the group name and click it.\n"
-            f"   b. If not visible: click the search box at the TOP of the sidebar,\n"
-            f"      type \"{group_name}\", then click the matching result.\n"
-            f"   c. If a full-screen search overlay appears, press Escape and retry.\n"
-            f"4. Once the group chat is open, scan for TWO types of downloadable content:\n"
-            f"   TYPE A — File attachment cards (PDF, XLSX, DOCX, etc.):\n"
-            f"   - Cards show: file icon + filename + file size + Download (下载) button.\n"
-            f"   - Hover over a card to reveal the Download button if not visible.\n"
-            f"   - Click the Download button directly.\n"
-            f"   TYPE B — Inline images / screenshots shared in chat:\n"
-            f"   - These appear as image thumbnails or previews in the chat.\n"
-            f"   - To download: RIGHT-CLICK on the image → select 'Save As' or '另存为'\n"
-            f"     or '下载' from the context menu → click Save in the dialog.\n"
-            f"   - The filename shown in the Save As dialog is the actual filename to check\n"
-            f"     against the already-downloaded list.\n"
-            f"5. For each NEW item (not in the already-downloaded list):\n"
-            f"   a. File card: click its Download (下载) button.\n"
-            f"   b. Inline image: right-click → Save As / 另存为 / 下载 → Save.\n"
-            f"   c. FILENAME RULE — When the Save As dialog appears, rename the file\n"
-            f"      to include the message's upload timestamp before saving:\n"
-            f"      - Note the timestamp shown on the chat message (e.g. '02/26 17:30')\n"
-            f"        BEFORE you click Download / right-click the image.\n"
-            f"      - In the Save As dialog: triple-click the filename field to select all,\n"
-            f"        then type the new name in this format:\n"
-            f"        {{original_name}}_{{YYYY-MM-DD_HH-mm}}{{extension}}\n"
-            f"        Examples:\n"
-            f"          '路透晚报.pdf'  uploaded at '02/26 17:30'  →  '路透晚报_2026-02-26_17-30.pdf'\n"
-            f"          'IMG_1234.jpg'  uploaded at '02/23 15:21'  →  'IMG_1234_2026-02-23_15-21.jpg'\n"
-            f"        Convert DingTalk date '02/26' using current year (2026).\n"
-            f"        Use hyphens in the time part (17-30 not 17:30) so it is filename-safe.\n"
-            f"        If the timestamp says 'Yesterday' use today's date minus one day.\n"
-            f"        If the timestamp says 'Today' use today's date.\n"
-            f"      - Then click Save.\n"
-            f"   d. Wait 1-2 seconds after each download.\n"
-            f"6. Scroll UP in the chat to see older messages. Repeat for ~{max_scrolls} screens.\n"
-            f"7. When all visible content has been processed, say: TASK COMPLETE\n\n"
-            f"NOTES:\n"
-            f"- '下载' means Download, '另存为' means Save As in Chinese.\n"
-            f"- Do NOT open the Files tab — only scan chat messages.\n"
-            f"- If an update/notification dialog appears, dismiss it first "
-            f"  (click 'Later', '稍后', 'Cancel', '取消', or press Escape).\n"
-            f"- Download directory: {download_dir}\n"
-            f"- Start by taking a screenshot now."
+            f"FILES ALREADY DOWNLOADED (skip these): {already_str}\n\n"
+            f"Scroll-up passes: ~{max_scrolls} screens.\n"
+            f"Download directory: {download_dir}\n"
+            f"Start by taking a screenshot now."
         )
 
         # Attach initial screenshot to the first message
@@ -286,12 +745,17 @@ class ClaudeAgent:
             {
                 "role": "user",
                 "content": [
-                    {"type": "text", "text": task_prompt},
+                    {
+                        "type": "text",
+                        "text": _STATIC_INSTRUCTIONS,
+                        "cache_control": {"type": "ephemeral"},
+                    },
+                    {"type": "text", "text": dynamic_tail},
                     {
                         "type": "image",
                         "source": {
                             "type": "base64",
-                            "media_type": "image/png",
+                            "media_type": "image/jpeg",
                             "data": initial_screenshot,
                         },
                     },
@@ -305,14 +769,40 @@ class ClaudeAgent:
                 iteration + 1, MAX_ITERATIONS, group_name,
             )
 
+            # Stream the response so each tool call runs as soon as its
+            # block finishes generating, overlapping model generation with
+            # pyautogui execution instead of waiting for the full message.
+            tool_results: List[Dict[str, Any]] = []
+            executed_ids: set = set()
+            # Held back one block so chained actions can be detected: a
+            # block executes once its successor arrives (marked chained).
+            # The final block is NOT run at stream end — it executes below
+            # only after stop_reason confirms the turn wasn't truncated.
+            held: Optional[Any] = None
             try:
-                response = self._client.beta.messages.create(
+                with self._client.beta.messages.stream(
                     model=self._model,
                     max_tokens=4096,
                     tools=[computer_tool],
                     messages=messages,
                     betas=["computer-use-2025-01-24"],
-                )
+                ) as stream:
+                    # Overlap the wait with the next capture; a leading
+                    # "screenshot" action then costs nothing extra.
+                    self._pending_shot = self._take_screenshot()
+                    for event in stream:
+                        block = getattr(event, "content_block", None)
+                        if (
+                            getattr(event, "type", "") == "content_block_stop"
+                            and getattr(block, "type", None) == "tool_use"
+                        ):
+                            if held is not None:
+                                tool_results.append(
+                                    self._run_tool_use(held, will_follow=True)
+                                )
+                                executed_ids.add(held.id)
+                            held = block
+                    response = stream.get_final_message()
             except anthropic.APIError as exc:
                 log.error("ClaudeAgent API error (iter %d): %s", iteration + 1, exc)
                 break
@@ -336,17 +826,19 @@ class ClaudeAgent:
             # Add assistant turn to conversation
             messages.append({"role": "assistant", "content": response.content})
 
-            # Log and check any text blocks
-            for block in response.content:
-                if hasattr(block, "text") and block.text:
-                    log.info("  [Claude] %s", block.text.strip())
-
-            # Check for task-complete signal
+            # Collect text blocks in one pass — reused for both logging and
+            # the task-complete check below.
+            text_blocks = [
+                block.text for block in response.content
+                if getattr(block, "type", None) == "text" and block.text
+            ]
+            for text in text_blocks:
+                log.info("  [Claude] %s", text.strip())
+
+            # Check for task-complete signal — per-block so the scan
+            # short-circuits without joining/uppercasing the whole message.
             if response.stop_reason == "end_turn":
-                full_text = " ".join(
-                    block.text for block in response.content if hasattr(block, "text")
-                )
-                if "TASK COMPLETE" in full_text.upper():
+                if any("task complete" in t.lower() for t in text_blocks):
                     log.info("ClaudeAgent: TASK COMPLETE for group '%s'.", group_name)
                 else:
                     log.info("ClaudeAgent: end_turn for group '%s'.", group_name)
@@ -358,65 +850,34 @@ class ClaudeAgent:
                 )
                 break
 
-            # Execute tool calls and collect results
-            tool_results: List[Dict[str, Any]] = []
-            for block in response.content:
-                if not hasattr(block, "type") or block.type != "tool_use":
-                    continue
-                if block.name != "computer":
-                    log.warning("ClaudeAgent: unexpected tool name=%r", block.name)
-                    continue
-
-                result = self._execute_action(block.input)
-
-                if result is None or (isinstance(result, str) and result.startswith("Cursor")):
-                    # Take a fresh screenshot after the action
-                    time.sleep(0.5)
-                    screenshot_b64 = self._take_screenshot()
-                    content: Any = [
-                        {
-                            "type": "image",
-                            "source": {
-                                "type": "base64",
-                                "media_type": "image/png",
-                                "data": screenshot_b64,
-                            },
-                        }
-                    ]
-                    if result and result.startswith("Cursor"):
-                        content.insert(0, {"type": "text", "text": result})
-                else:
-                    # result is already a screenshot base64
-                    content = [
-                        {
-                            "type": "image",
-                            "source": {
-                                "type": "base64",
-                                "media_type": "image/png",
-                                "data": result,
-                            },
-                        }
-                    ]
-
-                tool_results.append({
-                    "type": "tool_result",
-                    "tool_use_id": block.id,
-                    "content": content,
-                })
+            # Execute the held final block plus any tool calls the stream
+            # didn't already run (SDK versions whose stop events omit the
+            # assembled block).  Running from the final message's content
+            # guarantees complete, validated input — a max_tokens-truncated
+            # tool_use never reaches here because of the break above.
+            remaining = [
+                block for block in response.content
+                if getattr(block, "type", None) == "tool_use"
+                and block.id not in executed_ids
+            ]
+            for i, block in enumerate(remaining):
+                tool_results.append(
+                    self._run_tool_use(block, will_follow=i < len(remaining) - 1)
+                )
 
             if tool_results:
                 messages.append({"role": "user", "content": tool_results})
 
+            # Keep input-token growth bounded: old screenshots add nothing
+            # once superseded but are re-uploaded on every call.
+            self._trim_old_screenshots(messages)
+
         else:
             log.warning(
                 "ClaudeAgent: hit MAX_ITERATIONS (%d) for group '%s'.",
                 MAX_ITERATIONS, group_name,
             )
 
-        # Save action log for this session
-        log_path = self._session_dir / "actions.jsonl"
-        with open(log_path, "a", encoding="utf-8") as f:
-            for entry in self._action_log:
-                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
-        self._action_log.clear()
-        log.info("ClaudeAgent: actions saved → %s", log_path)
+        # Flush whatever didn't make a full batch
+        self._flush_action_log()
+        log.info("ClaudeAgent: actions saved → %s", self._session_dir / "actions.jsonl")
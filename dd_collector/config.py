@@ -2,13 +2,18 @@
 
 from __future__ import annotations
 
+import dataclasses
+import functools
 import os
 from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, List, get_args, get_origin, get_type_hints
 
 import yaml
 
+# libyaml C loader when the extension is available (~10x faster parse)
+_YamlLoader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
 
 # ── Dataclasses ──────────────────────────────────────────────
 
@@ -103,6 +108,13 @@ class ClaudeConfig:
     model: str = "claude-haiku-4-5-20251001"
     # Number of scroll-up passes per group when scanning for file cards
     max_scrolls: int = 5
+    # Autonomous-agent screenshots: long-edge cap (px) and JPEG quality of
+    # the downscaled frames sent to Claude each turn
+    screenshot_max_edge: int = 1280
+    screenshot_jpeg_quality: int = 75
+    # Capture only the DingTalk window rect instead of the full desktop.
+    # Cheaper per turn, but the agent loses taskbar/dialog context.
+    capture_window_only: bool = False
 
 
 @dataclass
@@ -129,110 +141,62 @@ class AppConfig:
 
 # ── Loader ───────────────────────────────────────────────────
 
-def _build_selector(data: Any) -> SelectorConfig:
+def _build(cls: type, data: Any) -> Any:
+    """Recursively construct dataclass *cls* from a raw YAML mapping.
+
+    Walks the dataclass fields instead of hand-writing one ``raw.get``
+    per key: nested dataclasses and lists of dataclasses recurse, ints
+    are coerced (YAML users write "10" and 10 interchangeably), unknown
+    keys are ignored, and missing keys keep the field defaults.
+    """
     if not isinstance(data, dict):
-        return SelectorConfig()
-    return SelectorConfig(
-        control_type=data.get("control_type", ""),
-        name=data.get("name", ""),
-        fallback_control_type=data.get("fallback_control_type", ""),
-        class_name=data.get("class_name", ""),
-    )
-
-
-def _build_ui_selectors(data: Dict[str, Any]) -> UISelectorsConfig:
-    sel = UISelectorsConfig()
-    sel.search_box = _build_selector(data.get("search_box"))
-    sel.search_result_item = _build_selector(data.get("search_result_item"))
-    sel.files_tab = _build_selector(data.get("files_tab"))
-    sel.file_list = _build_selector(data.get("file_list"))
-    sel.file_item = _build_selector(data.get("file_item"))
-    sel.download_button = _build_selector(data.get("download_button"))
-    sel.context_menu_download = _build_selector(data.get("context_menu_download"))
-    sel.dismiss_buttons = data.get("dismiss_buttons", [])
-    return sel
+        return cls()
+    hints = get_type_hints(cls)
+    kwargs: dict = {}
+    for f in dataclasses.fields(cls):
+        if f.name not in data:
+            continue
+        value = data[f.name]
+        ftype = hints.get(f.name, f.type)
+        if dataclasses.is_dataclass(ftype):
+            value = _build(ftype, value)
+        elif get_origin(ftype) is list:
+            (item_type,) = get_args(ftype)
+            if dataclasses.is_dataclass(item_type):
+                value = [_build(item_type, v) for v in value or []]
+            else:
+                value = list(value or [])
+        elif ftype is int:
+            value = int(value)
+        kwargs[f.name] = value
+    return cls(**kwargs)
 
 
 def load_config(path: str = "config.yaml") -> AppConfig:
-    """Load config.yaml and return a validated AppConfig."""
+    """Load config.yaml and return a validated AppConfig.
+
+    Re-parses only when the file's mtime changes — long-running modes
+    (--loop, --trigger) reload the config every cycle, and the cached
+    result makes those reloads free.  Callers must treat the returned
+    AppConfig as read-only: it is shared between cache hits.
+    """
     config_path = Path(path)
     if not config_path.exists():
         raise FileNotFoundError(f"Config file not found: {config_path.resolve()}")
+    return _load_config_cached(str(config_path), config_path.stat().st_mtime_ns)
+
+
+@functools.lru_cache(maxsize=4)
+def _load_config_cached(path: str, mtime_ns: int) -> AppConfig:
+    with open(path, "r", encoding="utf-8") as f:
+        raw = yaml.load(f, Loader=_YamlLoader) or {}
+
+    cfg = _build(AppConfig, raw)
 
-    with open(config_path, "r", encoding="utf-8") as f:
-        raw = yaml.safe_load(f) or {}
-
-    cfg = AppConfig()
-
-    # DingTalk
-    dt = raw.get("dingtalk", {})
-    cfg.dingtalk = DingTalkConfig(
-        window_class=dt.get("window_class", cfg.dingtalk.window_class),
-        download_dir=dt.get("download_dir", cfg.dingtalk.download_dir),
-        timeout=int(dt.get("timeout", cfg.dingtalk.timeout)),
-        download_wait=int(dt.get("download_wait", cfg.dingtalk.download_wait)),
-        download_icon_offset=int(dt.get("download_icon_offset", cfg.dingtalk.download_icon_offset)),
-        exe_path=dt.get("exe_path", cfg.dingtalk.exe_path),
-    )
-
-    # Groups
-    for g in raw.get("groups", []):
-        cfg.groups.append(GroupConfig(
-            name=g.get("name", ""),
-            alias=g.get("alias", ""),
-        ))
-
-    # Google Drive
-    gd = raw.get("gdrive", {})
-    cfg.gdrive = GDriveConfig(base_path=gd.get("base_path", ""))
-
-    # Polling
-    p = raw.get("polling", {})
-    cfg.polling = PollingConfig(
-        interval_minutes=int(p.get("interval_minutes", cfg.polling.interval_minutes)),
-        max_downloads_per_group=int(p.get("max_downloads_per_group", cfg.polling.max_downloads_per_group)),
-        chat_scroll_pages=int(p.get("chat_scroll_pages", cfg.polling.chat_scroll_pages)),
-    )
-
-    # Dedup
-    d = raw.get("dedup", {})
-    cfg.dedup = DedupConfig(path=d.get("path", cfg.dedup.path))
-
-    # Logging
-    lg = raw.get("logging", {})
-    cfg.logging = LoggingConfig(
-        dir=lg.get("dir", cfg.logging.dir),
-        level=lg.get("level", cfg.logging.level),
-        max_bytes=int(lg.get("max_bytes", cfg.logging.max_bytes)),
-        backup_count=int(lg.get("backup_count", cfg.logging.backup_count)),
-    )
-
-    # UI Selectors
-    cfg.ui_selectors = _build_ui_selectors(raw.get("ui_selectors", {}))
-
-    # VLM
-    v = raw.get("vlm", {})
-    cfg.vlm = VLMConfig(
-        api_key=v.get("api_key", os.environ.get("OPENROUTER_API_KEY", "")),
-        model=v.get("model", cfg.vlm.model),
-        base_url=v.get("base_url", cfg.vlm.base_url),
-        capture_margin=int(v.get("capture_margin", cfg.vlm.capture_margin)),
-    )
-
-    # Claude computer-use agent
-    cl = raw.get("claude", {})
-    cfg.claude = ClaudeConfig(
-        oauth_token=cl.get("oauth_token", os.environ.get("ANTHROPIC_AUTH_TOKEN", "")),
-        model=cl.get("model", cfg.claude.model),
-        max_scrolls=int(cl.get("max_scrolls", cfg.claude.max_scrolls)),
-    )
-
-    # Trigger watcher
-    tr = raw.get("trigger", {})
-    cfg.trigger = TriggerConfig(
-        check_interval_seconds=int(tr.get("check_interval_seconds", cfg.trigger.check_interval_seconds)),
-        red_pixel_threshold=int(tr.get("red_pixel_threshold", cfg.trigger.red_pixel_threshold)),
-        cooldown_seconds=int(tr.get("cooldown_seconds", cfg.trigger.cooldown_seconds)),
-    )
+    # Environment fallbacks for secrets left out of (or blank in) the YAML
+    if not cfg.vlm.api_key:
+        cfg.vlm.api_key = os.environ.get("OPENROUTER_API_KEY", "")
+    if not cfg.claude.oauth_token:
+        cfg.claude.oauth_token = os.environ.get("ANTHROPIC_AUTH_TOKEN", "")
 
     return cfg
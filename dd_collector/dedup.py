@@ -1,4 +1,4 @@
-"""JSON-based dedup tracker keyed by group::filename.
+"""JSON-based dedup tracker, grouped by group name.
 
 Also stores a per-group timestamp *watermark* so the incremental polling loop
 can skip files older than the last successful download.
@@ -6,71 +6,169 @@ can skip files older than the last successful download.
 
 from __future__ import annotations
 
+import atexit
+import functools
 import json
 import logging
+import os
+import sys
 import time
+from collections import defaultdict
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Dict, FrozenSet, List, Optional
+
+try:
+    import orjson  # C serializer: ~5x faster dumps/loads than stdlib json
+except ImportError:
+    orjson = None
+
+try:
+    import ijson  # streaming parser: keeps peak load memory near file size
+except ImportError:
+    ijson = None
 
 log = logging.getLogger("dd_collector")
 
 
+def _loads(data) -> dict:
+    if orjson is not None:
+        return orjson.loads(data)
+    if isinstance(data, bytes):
+        data = data.decode("utf-8")
+    return json.loads(data)
+
+
+def _dumps_line(record: dict) -> str:
+    if orjson is not None:
+        return orjson.dumps(record).decode("utf-8")
+    return json.dumps(record, ensure_ascii=False, separators=(",", ":"))
+
+
 class DedupTracker:
     """Track which files have been downloaded per group.
 
-    Storage format (data/downloaded.json):
+    Storage format (data/downloaded.json, version 2):
     {
-        "GroupA::report.pdf": {
-            "timestamp": 1700000000.0,
-            "dest": "G:/My Drive/DingTalk Files/GroupA/2024-01/report.pdf"
+        "__format__": 2,
+        "groups": {
+            "GroupA": {
+                "report.pdf": {"timestamp": 1700000000, "d": 0, "n": "report.pdf"},
+                "2025/07/02 13:52::notes.docx": {...}   # chat composite
+            }
         },
-        ...
+        "watermarks": {
+            "GroupA": {"timestamp_str": "2025/07/02 13:52", "updated": ...}
+        },
+        "dirs": ["G:/My Drive/DingTalk Files/GroupA/2024-01"]
     }
+
+    Destination paths are stored as (dir id, basename) against the shared
+    "dirs" table — group folders repeat across hundreds of entries, so
+    interning the directory string cuts most of the snapshot bytes.
+
+    Version-1 files (flat ``group::filename`` keys) are migrated on load.
     """
 
+    _FORMAT_VERSION = 2
+
+    # Compact once the log outgrows max(this, 2x the snapshot size).
+    _COMPACT_MIN_BYTES = 65536
+    # How many appends between log-size checks (fstat is not free either).
+    _COMPACT_CHECK_EVERY = 64
+
     def __init__(self, path: str = "data/downloaded.json"):
         self._path = Path(path)
-        self._data: Dict[str, dict] = {}
+        self._log_path = self._path.with_suffix(".log.jsonl")
+        # Two-level store: group name -> {filename or "ts::filename" -> entry}.
+        # Membership tests are plain dict lookups — no composite-key string
+        # building or prefix parsing on the hot path.
+        self._groups: Dict[str, Dict[str, dict]] = {}
+        self._watermarks: Dict[str, dict] = {}
+        # Dest-directory intern table: entries store {"d": id, "n": basename}.
+        self._dir_list: List[str] = []
+        self._dir_ids: Dict[str, int] = {}
+        # Secondary index: group name -> plain filenames, as an
+        # insertion-ordered dict-of-None so get_downloaded_for_group is
+        # O(1) *and* oldest-first — callers slice [-50:] for "newest".
+        self._by_group: Dict[str, Dict[str, None]] = defaultdict(dict)
+        # Memoized frozenset views of _by_group, invalidated on mark.
+        self._group_set_cache: Dict[str, FrozenSet[str]] = {}
+        self._snapshot_size = 0
         self._load()
+        # Append-only write-ahead log: each mark costs one small write
+        # instead of a full-store rewrite; the snapshot is refreshed only
+        # when the log grows past the compaction threshold.
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        self._dir_ready = True  # mkdir once per process, not per compaction
+        self._log_fp = open(self._log_path, "a", encoding="utf-8")
+        self._appends_since_check = 0
+        self._in_batch = 0
+        atexit.register(self.flush)
 
     # ── Public API ───────────────────────────────────────────
 
+    @contextmanager
+    def batch(self):
+        """Coalesce disk flushes across a burst of marks.
+
+        Inside ``with tracker.batch():`` each mark still appends its log
+        record, but the flush and the compaction check happen once on
+        exit instead of per call.  Nestable.
+        """
+        self._in_batch += 1
+        try:
+            yield self
+        finally:
+            self._in_batch -= 1
+            if self._in_batch == 0:
+                self.flush()
+                self._maybe_compact()
+
     def is_downloaded(self, group_name: str, file_name: str) -> bool:
-        key = self._key(group_name, file_name)
-        return key in self._data
+        return file_name in self._groups.get(group_name, ())
 
     def mark_downloaded(
         self, group_name: str, file_name: str, dest_path: str
     ) -> None:
-        key = self._key(group_name, file_name)
-        self._data[key] = {
-            "timestamp": time.time(),
-            "dest": dest_path,
+        group_name = sys.intern(group_name)
+        existing = self._groups.get(group_name, {}).get(file_name)
+        if existing and self._entry_dest(existing) == dest_path:
+            return  # repeat mark (retry loop) — nothing new to persist
+        entry = {
+            "timestamp": int(time.time()),
+            "d": self._dir_id(os.path.dirname(dest_path)),
+            "n": os.path.basename(dest_path),
         }
-        self._save()
+        self._groups.setdefault(group_name, {})[file_name] = entry
+        self._by_group[group_name][file_name] = None
+        self._group_set_cache.pop(group_name, None)
+        self._append({"g": group_name, "k": file_name, "v": entry})
 
     def get_downloaded_for_group(self, group_name: str) -> List[str]:
         """Return list of filenames already downloaded for a group.
 
-        Normalises composite keys written by the old main.py path
-        (``group::timestamp::filename``) to plain filenames so the
+        Composite keys written by the chat path (``timestamp::filename``)
+        are normalised to plain filenames at index-build time, so the
         dedup check works regardless of which system created the entry.
+        The list is oldest-first, matching mark order — callers rely on
+        this to keep the newest entries when truncating.
         """
-        prefix = f"{group_name}::"
-        results = []
-        for k in self._data:
-            if not k.startswith(prefix) or k.startswith("__watermark__::"):
-                continue
-            suffix = k[len(prefix):]
-            # Composite key "timestamp::filename" → extract just the filename
-            if "::" in suffix:
-                suffix = suffix.rsplit("::", 1)[-1]
-            results.append(suffix)
-        return results
+        return list(self._by_group.get(group_name, ()))
 
-    # ── Watermark (incremental high-water mark) ──────────────
+    def get_downloaded_set(self, group_name: str) -> FrozenSet[str]:
+        """Like :meth:`get_downloaded_for_group` but as a cached frozenset.
 
-    _WATERMARK_PREFIX = "__watermark__::"
+        Preferred for membership tests — O(1) per lookup and no list
+        rebuild per call.
+        """
+        cached = self._group_set_cache.get(group_name)
+        if cached is None:
+            cached = frozenset(self._by_group.get(group_name, ()))
+            self._group_set_cache[group_name] = cached
+        return cached
+
+    # ── Watermark (incremental high-water mark) ──────────────
 
     def get_watermark(self, group_name: str) -> Optional[str]:
         """Return the last-downloaded timestamp string for *group_name*.
@@ -78,51 +176,53 @@ class DedupTracker:
         Format matches DingTalk file row timestamps: ``'2025/07/02 13:52'``.
         Returns ``None`` if no watermark has been set yet.
         """
-        key = f"{self._WATERMARK_PREFIX}{group_name}"
-        entry = self._data.get(key)
+        entry = self._watermarks.get(group_name)
         if isinstance(entry, dict):
             return entry.get("timestamp_str")
         return None
 
     def set_watermark(self, group_name: str, timestamp_str: str) -> None:
         """Persist the high-water mark for *group_name*."""
-        key = f"{self._WATERMARK_PREFIX}{group_name}"
-        self._data[key] = {
+        if self.get_watermark(group_name) == timestamp_str:
+            return  # unchanged — skip the log write and the INFO line
+        group_name = sys.intern(group_name)
+        entry = {
             "timestamp_str": timestamp_str,
-            "updated": time.time(),
+            "updated": int(time.time()),
         }
-        self._save()
+        self._watermarks[group_name] = entry
+        self._append({"g": group_name, "wm": entry})
         log.info(
             "Watermark updated for '%s': %s", group_name, timestamp_str,
         )
 
-    # ── Chat-based dedup (composite key: group::timestamp::filename) ──
+    # ── Chat-based dedup (composite subkey: timestamp::filename) ──
 
     @staticmethod
-    def _chat_key(
-        group_name: str, file_name: str, msg_timestamp: str,
-    ) -> str:
-        """Build a composite dedup key for chat-based downloads.
+    @functools.lru_cache(maxsize=4096)
+    def _chat_key(file_name: str, msg_timestamp: str) -> str:
+        """Build a composite dedup subkey for chat-based downloads.
 
-        Using ``group::timestamp::filename`` instead of ``group::filename``
+        Using ``timestamp::filename`` instead of plain ``filename``
         because the same filename can be re-shared in chat.
         """
-        return f"{group_name}::{msg_timestamp}::{file_name}"
+        return f"{msg_timestamp}::{file_name}"
 
     def is_downloaded_chat(
         self, group_name: str, file_name: str, msg_timestamp: str,
     ) -> bool:
         """Check if a chat attachment has been downloaded (composite key).
 
-        Also checks the legacy ``group::filename`` key for backward
-        compatibility with files downloaded before the chat-based switch.
+        Also checks the plain-filename key for backward compatibility
+        with files downloaded before the chat-based switch.
         """
-        key = self._chat_key(group_name, file_name, msg_timestamp)
-        if key in self._data:
-            return True
-        # Backward compat: check legacy key
-        legacy_key = self._key(group_name, file_name)
-        return legacy_key in self._data
+        entries = self._groups.get(group_name)
+        if not entries:
+            return False
+        return (
+            self._chat_key(file_name, msg_timestamp) in entries
+            or file_name in entries
+        )
 
     def mark_downloaded_chat(
         self,
@@ -132,44 +232,221 @@ class DedupTracker:
         dest_path: str,
     ) -> None:
         """Mark a chat attachment as downloaded using the composite key."""
-        key = self._chat_key(group_name, file_name, msg_timestamp)
-        self._data[key] = {
-            "timestamp": time.time(),
+        group_name = sys.intern(group_name)
+        key = self._chat_key(file_name, msg_timestamp)
+        existing = self._groups.get(group_name, {}).get(key)
+        if existing and self._entry_dest(existing) == dest_path:
+            return  # repeat mark (retry loop) — nothing new to persist
+        entry = {
+            "timestamp": int(time.time()),
             "msg_timestamp": msg_timestamp,
-            "dest": dest_path,
+            "d": self._dir_id(os.path.dirname(dest_path)),
+            "n": os.path.basename(dest_path),
         }
-        self._save()
+        self._groups.setdefault(group_name, {})[key] = entry
+        self._by_group[group_name][file_name] = None
+        self._group_set_cache.pop(group_name, None)
+        self._append({"g": group_name, "k": key, "v": entry})
 
     # ── Internal ─────────────────────────────────────────────
 
-    @staticmethod
-    def _key(group_name: str, file_name: str) -> str:
-        return f"{group_name}::{file_name}"
+    _WATERMARK_PREFIX = "__watermark__::"
 
-    def _load(self) -> None:
-        if not self._path.exists():
-            self._data = {}
+    def _dir_id(self, dir_path: str) -> int:
+        """Return the intern-table id for *dir_path*, registering it if new."""
+        did = self._dir_ids.get(dir_path)
+        if did is None:
+            did = len(self._dir_list)
+            self._dir_ids[dir_path] = did
+            self._dir_list.append(dir_path)
+            # Log the table entry before any record that references it so
+            # replay sees ids in assignment order.
+            self._append({"dir": dir_path})
+        return did
+
+    def _entry_dest(self, entry: dict) -> Optional[str]:
+        """Reconstruct the destination path of an entry (any format)."""
+        if "dest" in entry:  # legacy inline path
+            return entry["dest"]
+        try:
+            return os.path.join(self._dir_list[entry["d"]], entry["n"])
+        except (KeyError, IndexError, TypeError):
+            return None
+
+    def _ingest_snapshot(self, raw: dict) -> None:
+        """Populate the store from a parsed snapshot, migrating v1 files.
+
+        Version-1 snapshots are one flat dict keyed ``group::filename``,
+        ``group::timestamp::filename`` or ``__watermark__::group``.
+        """
+        if raw.get("__format__") == self._FORMAT_VERSION:
+            # Intern group names so repeat lookups hash/compare by pointer.
+            self._groups = {
+                sys.intern(g): v for g, v in (raw.get("groups") or {}).items()
+            }
+            self._watermarks = {
+                sys.intern(g): v
+                for g, v in (raw.get("watermarks") or {}).items()
+            }
+            self._dir_list = list(raw.get("dirs") or [])
+            self._dir_ids = {d: i for i, d in enumerate(self._dir_list)}
             return
+        migrated = 0
+        for k, v in raw.items():
+            if k.startswith(self._WATERMARK_PREFIX):
+                self._watermarks[sys.intern(k[len(self._WATERMARK_PREFIX):])] = v
+            elif "::" in k:
+                group, subkey = k.split("::", 1)
+                self._groups.setdefault(sys.intern(group), {})[subkey] = v
+            migrated += 1
+        if migrated:
+            log.info("Dedup: migrated %d legacy store entries", migrated)
+
+    def _load(self) -> None:
+        self._groups = {}
+        self._watermarks = {}
+        if self._path.exists():
+            try:
+                if ijson is not None:
+                    # Stream key/value pairs instead of materialising the
+                    # parse tree — a large snapshot loads at ~1x file size.
+                    raw = {}
+                    with open(self._path, "rb") as f:
+                        # use_float: ijson otherwise yields Decimal for JSON
+                        # floats (legacy v1 timestamps), which neither json
+                        # nor orjson can serialize back at compaction time.
+                        for k, v in ijson.kvitems(f, "", use_float=True):
+                            raw[k] = v
+                else:
+                    raw = _loads(self._path.read_bytes())
+                    if not isinstance(raw, dict):
+                        raise ValueError("Root is not a dict")
+                self._ingest_snapshot(raw)
+                self._snapshot_size = self._path.stat().st_size
+            except Exception as exc:
+                log.warning(
+                    "Dedup file corrupt or unreadable (%s), starting fresh: %s",
+                    self._path, exc,
+                )
+                self._groups = {}
+                self._watermarks = {}
+
+        # Replay mutations appended since the last compaction.  A torn
+        # final line (crash mid-write) is skipped, losing only that mark.
+        if self._log_path.exists():
+            replayed = 0
+            try:
+                with open(self._log_path, "r", encoding="utf-8") as f:
+                    for line in f:
+                        line = line.strip()
+                        if not line:
+                            continue
+                        try:
+                            rec = _loads(line)
+                            self._replay(rec)
+                            replayed += 1
+                        except Exception:
+                            log.warning("Skipping corrupt dedup log line")
+            except Exception as exc:
+                log.warning("Dedup log unreadable (%s): %s", self._log_path, exc)
+            if replayed:
+                log.debug("Dedup: replayed %d log record(s)", replayed)
+
+        self._reindex()
+
+    def _replay(self, rec: dict) -> None:
+        """Apply one log record (current or legacy-flat shape) to the store."""
+        if "dir" in rec:
+            path = rec["dir"]
+            if path not in self._dir_ids:
+                self._dir_ids[path] = len(self._dir_list)
+                self._dir_list.append(path)
+        elif "g" in rec:
+            group = sys.intern(rec["g"])
+            if "wm" in rec:
+                self._watermarks[group] = rec["wm"]
+            else:
+                self._groups.setdefault(group, {})[rec["k"]] = rec["v"]
+        else:
+            # Legacy flat record: {"k": "group::...", "v": entry}
+            self._ingest_snapshot({rec["k"]: rec["v"]})
+
+    def _reindex(self) -> None:
+        """Rebuild the per-group filename index from the grouped store."""
+        self._by_group.clear()
+        self._group_set_cache.clear()
+        for group, entries in self._groups.items():
+            names = self._by_group[group]
+            for subkey in entries:
+                # Composite "timestamp::filename" → extract just the filename
+                if "::" in subkey:
+                    subkey = subkey.rsplit("::", 1)[-1]
+                names[subkey] = None
+
+    def _append(self, record: dict) -> None:
+        """Persist one mutation as an O(1) append to the write-ahead log."""
         try:
-            with open(self._path, "r", encoding="utf-8") as f:
-                self._data = json.load(f)
-            if not isinstance(self._data, dict):
-                raise ValueError("Root is not a dict")
+            self._log_fp.write(_dumps_line(record) + "\n")
+            if not self._in_batch:
+                self._log_fp.flush()
         except Exception as exc:
-            log.warning(
-                "Dedup file corrupt or unreadable (%s), starting fresh: %s",
-                self._path, exc,
-            )
-            self._data = {}
+            log.error("Failed to append to dedup log: %s", exc)
+            return
+        self._appends_since_check += 1
+        if not self._in_batch:
+            self._maybe_compact()
 
-    def _save(self) -> None:
-        self._path.parent.mkdir(parents=True, exist_ok=True)
+    def _maybe_compact(self) -> None:
+        """Compact when enough appends have accumulated and the log is big."""
+        if self._appends_since_check < self._COMPACT_CHECK_EVERY:
+            return
+        self._appends_since_check = 0
+        threshold = max(self._COMPACT_MIN_BYTES, 2 * self._snapshot_size)
+        if self._log_fp.tell() > threshold:
+            self.compact()
+
+    def flush(self) -> None:
+        """Push buffered log records to the OS (cheap; safe to call often)."""
+        try:
+            self._log_fp.flush()
+        except Exception:
+            pass
+
+    def compact(self) -> None:
+        """Fold the log into a fresh snapshot and truncate it."""
+        if not self._dir_ready:
+            self._path.parent.mkdir(parents=True, exist_ok=True)
+            self._dir_ready = True
         tmp = self._path.with_suffix(".tmp")
+        snapshot = {
+            "__format__": self._FORMAT_VERSION,
+            "groups": self._groups,
+            "watermarks": self._watermarks,
+            "dirs": self._dir_list,
+        }
         try:
-            with open(tmp, "w", encoding="utf-8") as f:
-                json.dump(self._data, f, ensure_ascii=False, indent=2)
+            if orjson is not None:
+                payload = orjson.dumps(snapshot)
+            else:
+                # Machine-only file: compact separators halve the bytes
+                # written per compaction vs pretty-printing.
+                payload = json.dumps(
+                    snapshot, ensure_ascii=False, separators=(",", ":"),
+                ).encode("utf-8")
+            # Serialize first, then one write() + fsync on a binary fd —
+            # no buffered-IO flushing in pieces, and the rename is only
+            # done once the bytes are durably on disk.
+            fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+            try:
+                os.write(fd, payload)
+                os.fsync(fd)
+            finally:
+                os.close(fd)
             tmp.replace(self._path)
+            self._snapshot_size = self._path.stat().st_size
+            self._log_fp.truncate(0)
+            log.debug("Dedup: compacted snapshot (%d bytes)", self._snapshot_size)
         except Exception as exc:
-            log.error("Failed to save dedup file: %s", exc)
+            log.error("Failed to compact dedup store: %s", exc)
             if tmp.exists():
                 tmp.unlink()
@@ -10,27 +10,53 @@ import base64
 import io
 import logging
 import os
+import re
 import subprocess
 import time
+from collections import deque
 from dataclasses import dataclass
-from typing import List, Optional, Tuple
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Literal, Optional, Tuple
 
 import pyautogui
 import uiautomation as auto
 
+# pyautogui inserts a 0.1 s pause after every call by default; the scan
+# loop pays that twice per download (move + click) on top of its own
+# explicit waits, which already pace every interaction.  A small pause is
+# kept so DingTalk still sees distinct input events.
+pyautogui.PAUSE = 0.01
+pyautogui.MINIMUM_DURATION = 0
+
 from .config import AppConfig, SelectorConfig
+from .vlm import find_icon_coords, find_menu_item_coords, grab_screenshot_base64
 from .ui_helpers import (
     find_control,
     safe_click,
     safe_right_click,
     scroll_to_bottom,
     scroll_to_top,
+    clear_text,
     send_escape,
     set_text,
+    wait_until,
 )
 
 log = logging.getLogger("dd_collector")
 
+# Context-menu capture size: a DingTalk context menu renders ~180x240 px,
+# so a tight drop-right rectangle feeds the VLM ~4x fewer pixels than the
+# old capture_margin square centred on the click.
+_MENU_CAP_W = 220
+_MENU_CAP_H = 300
+
+# File-row Name parsing (hot loop in list_files — compiled once)
+_FILENAME_RE = re.compile(r"(.+?\.\w+)\s+[\d.]+ [KMGT]?B")
+_ABS_TS_RE = re.compile(r"(\d{4}/\d{2}/\d{2}\s+\d{2}:\d{2})")
+_TODAY_RE = re.compile(r"·Today\s+(\d{2}:\d{2})")
+_YDAY_RE = re.compile(r"·Yesterday\s+(\d{2}:\d{2})")
+_NBSP_TABLE = {0xA0: 0x20}  # non-breaking space → plain space
+
 
 @dataclass
 class FileInfo:
@@ -38,6 +64,10 @@ class FileInfo:
     name: str
     control: auto.Control  # reference to the ListItem for clicking
     timestamp: Optional[str] = None  # "YYYY/MM/DD HH:MM" from the raw Name
+    # (left, top, right, bottom) captured on first fetch so the download
+    # strategies don't each re-read BoundingRectangle over COM.  Refreshed
+    # whenever the row is scrolled into view.
+    rect: Optional[Tuple[int, int, int, int]] = None
 
 
 @dataclass
@@ -65,12 +95,38 @@ class DingTalkController:
         self.dt = config.dingtalk
         self.sel = config.ui_selectors
         self._window: Optional[auto.WindowControl] = None
+        # UIA handle cache: key -> (control-or-None, expiry).  Each find_control
+        # walk is a cross-process COM search, so resolved handles are reused
+        # for a short TTL; navigation events drop the specific keys they
+        # invalidate (the search box is stable across groups and survives).
+        self._ctrl_cache: Dict[tuple, Tuple[Optional[auto.Control], float]] = {}
+        # Hover-row screenshot prefetched by strategy 1 for the VLM fallback:
+        # (b64 png, (left, top, right, bottom)) or None.
+        self._hover_shot: Optional[Tuple[str, Tuple[int, int, int, int]]] = None
+        # Name of the group chat currently open, for skip-if-unchanged
+        # navigation on incremental re-scans.
+        self._current_group: Optional[str] = None
+        self._last_focus_ts: float = 0.0
+        self._dismiss_set: Optional[frozenset] = None
+        # Overlay-absent memo so back-to-back collapse calls skip the probe.
+        self._overlay_absent_until = 0.0
 
     # ── Connection ───────────────────────────────────────────
 
     # Known DingTalk window classes (tried in order).
     _WINDOW_CLASSES = ("DtMainFrameView", "StandardFrame_DingTalk")
 
+    def _find_window_class(self, max_search: float = 0.5) -> Optional[str]:
+        """Return the first known window class with a live window, else None."""
+        for cls_name in self._WINDOW_CLASSES:
+            try:
+                win = auto.WindowControl(ClassName=cls_name, searchDepth=1)
+                if win.Exists(maxSearchSeconds=max_search):
+                    return cls_name
+            except Exception:
+                pass
+        return None
+
     def ensure_running(self) -> bool:
         """Launch DingTalk if it is not already running.
 
@@ -82,14 +138,10 @@ class DingTalkController:
         Call this before ``connect()`` so the window is guaranteed to exist.
         """
         # Fast path: window already exists
-        for cls_name in self._WINDOW_CLASSES:
-            try:
-                win = auto.WindowControl(ClassName=cls_name, searchDepth=1)
-                if win.Exists(maxSearchSeconds=1):
-                    log.info("DingTalk already running (class=%s).", cls_name)
-                    return True
-            except Exception:
-                pass
+        cls_name = self._find_window_class(max_search=1)
+        if cls_name:
+            log.info("DingTalk already running (class=%s).", cls_name)
+            return True
 
         # Need to launch — check exe_path is configured
         exe_path = self.dt.exe_path
@@ -111,22 +163,20 @@ class DingTalkController:
             log.error("Failed to launch DingTalk: %s", exc)
             return False
 
-        # Wait up to 30 s for the window to appear
+        # Wait up to 30 s for the window to appear.  Adaptive poll: on a
+        # fast machine this returns in a few hundred ms instead of the old
+        # fixed 1 s quantum.  No post-appearance settle sleep — callers go
+        # through wait_for_ready(), whose dismiss+probe loop already copes
+        # with a UI that is still initialising.
         log.info("Waiting for DingTalk window (up to 30 s)…")
-        for elapsed in range(30):
-            time.sleep(1.0)
-            for cls_name in self._WINDOW_CLASSES:
-                try:
-                    win = auto.WindowControl(ClassName=cls_name, searchDepth=1)
-                    if win.Exists(maxSearchSeconds=1):
-                        log.info(
-                            "DingTalk window appeared after %ds (class=%s).",
-                            elapsed + 1, cls_name,
-                        )
-                        time.sleep(3.0)  # let the app fully initialise
-                        return True
-                except Exception:
-                    pass
+        start = time.monotonic()
+        cls_name = wait_until(self._find_window_class, timeout=30)
+        if cls_name:
+            log.info(
+                "DingTalk window appeared after %.1fs (class=%s).",
+                time.monotonic() - start, cls_name,
+            )
+            return True
 
         log.error("DingTalk window did not appear after 30 s.")
         return False
@@ -142,14 +192,23 @@ class DingTalkController:
         Returns True once the search box is found; False on timeout.
         """
         log.info("Waiting for DingTalk to be ready (up to %ds)…", timeout)
-        for elapsed in range(timeout):
+        start = time.monotonic()
+        deadline = start + timeout
+        delay = 0.1
+        while True:
             # Keep dismissing any dialogs that block the main UI
             self.dismiss_dialogs(max_rounds=1)
             box = self._find_search_box()
             if box:
-                log.info("DingTalk ready (search box found after %ds).", elapsed)
+                log.info(
+                    "DingTalk ready (search box found after %.1fs).",
+                    time.monotonic() - start,
+                )
                 return True
-            time.sleep(1.0)
+            if time.monotonic() >= deadline:
+                break
+            time.sleep(delay)
+            delay = min(delay * 1.5, 1.0)
         log.error("DingTalk not ready after %ds — search box never appeared.", timeout)
         return False
 
@@ -170,10 +229,7 @@ class DingTalkController:
                 win = auto.WindowControl(ClassName=cls_name, searchDepth=1)
                 if win.Exists(maxSearchSeconds=3):
                     self._window = win
-                    self._window.SetActive()
-                    time.sleep(0.3)
-                    self._window.SetFocus()
-                    time.sleep(0.3)
+                    self._focus_window(force=True)
                     log.info(
                         "Connected to DingTalk window (class=%s).", cls_name,
                     )
@@ -187,10 +243,95 @@ class DingTalkController:
         )
         return False
 
+    # ── Control cache ────────────────────────────────────────
+
+    @staticmethod
+    def _iter_descendants(root: auto.Control, max_depth: int = 10):
+        """Yield descendants of *root* breadth-first up to *max_depth*.
+
+        One GetChildren COM call per node instead of one timed find_control
+        search per candidate name — the bulk pattern for probing many
+        controls at once.  COM errors on individual nodes are swallowed.
+        """
+        queue = deque([(root, 0)])
+        while queue:
+            node, depth = queue.popleft()
+            if depth >= max_depth:
+                continue
+            try:
+                children = node.GetChildren()
+            except Exception:
+                continue
+            for child in children:
+                yield child
+                queue.append((child, depth + 1))
+
+    def _focus_window(self, force: bool = False) -> None:
+        """Bring the DingTalk window to the foreground, skipping when fresh.
+
+        SetActive + SetFocus plus their settle sleep cost ~0.3 s and run
+        at the top of nearly every interaction.  Focus rarely changes
+        between consecutive steps, so skip the round-trip when we focused
+        within the last 2 s and the window still reports active.
+        """
+        if not self._window:
+            return
+        now = time.monotonic()
+        if not force and now - self._last_focus_ts < 2.0:
+            try:
+                if self._window.IsActive():
+                    return
+            except Exception:
+                pass
+        try:
+            self._window.SetActive()
+            self._window.SetFocus()
+            self._last_focus_ts = now
+            wait_until(self._window.IsActive, timeout=0.5, interval=0.03)
+        except Exception:
+            pass
+
+    def _cached_find(
+        self,
+        key: tuple,
+        finder: Callable[[], Optional[auto.Control]],
+        ttl: float = 5.0,
+        negative_ttl: float = 0.0,
+    ) -> Optional[auto.Control]:
+        """Resolve a control through the TTL cache.
+
+        A cached handle is revalidated with a cheap ``Exists(0.1)`` before
+        reuse.  Misses run *finder* and cache the result; a None result is
+        cached only when *negative_ttl* is nonzero (to damp tight retries).
+        """
+        now = time.monotonic()
+        hit = self._ctrl_cache.get(key)
+        if hit is not None:
+            ctrl, expiry = hit
+            if now < expiry:
+                if ctrl is None:
+                    return None
+                try:
+                    if ctrl.Exists(maxSearchSeconds=0.1):
+                        return ctrl
+                except Exception:
+                    pass
+            self._ctrl_cache.pop(key, None)
+        ctrl = finder()
+        if ctrl is not None:
+            self._ctrl_cache[key] = (ctrl, now + ttl)
+        elif negative_ttl > 0:
+            self._ctrl_cache[key] = (None, now + negative_ttl)
+        return ctrl
+
     # ── Navigation ───────────────────────────────────────────
 
     def _find_search_box(self) -> Optional[auto.Control]:
-        """Locate the search box, trying ClassName first then Name.
+        """Locate the search box (cached), trying ClassName first then Name."""
+        return self._cached_find(("search_box",), self._locate_search_box)
+
+    def _locate_search_box(self) -> Optional[auto.Control]:
+        """Walk the UIA tree for the search box.
 
         The DingTalk search box is a QLineEdit with no Name attribute.
         Falls back to searching by Name='Search' for older UI versions.
@@ -242,6 +383,20 @@ class DingTalkController:
         if not self._window:
             return False
 
+        # Fast path: already in this group (incremental re-scan).  Verify
+        # cheaply before trusting the memo — a dialog or manual click may
+        # have moved us elsewhere.
+        if group_name == self._current_group and self._verify_group_opened():
+            log.info("Already in group: %s", group_name)
+            return True
+        self._current_group = None
+
+        # Navigation swaps the chat pane: the group header and file grid
+        # handles go stale, but the search box lives in the fixed top bar
+        # and stays valid across groups.
+        self._ctrl_cache.pop(("group_header",), None)
+        self._ctrl_cache.pop(("file_grid",), None)
+
         # DingTalk's update dialog can reappear immediately after dismissal.
         # Loop dismiss+check until the search box is actually accessible,
         # mirroring the wait_for_ready() pattern (up to 45 s).
@@ -260,17 +415,44 @@ class DingTalkController:
                 return False
 
         # Ensure DingTalk has real focus before pyautogui events
-        try:
-            self._window.SetActive()
-            self._window.SetFocus()
-            time.sleep(0.3)
-        except Exception:
-            pass
+        self._focus_window()
+
+        # Two attempts: the retry re-runs the same search sequence with
+        # delays stretched by a third for a slow-rendering overlay.
+        for attempt, delay_mult in enumerate((1.0, 1.33)):
+            if attempt:
+                log.warning(
+                    "Group chat may not be open after first attempt; "
+                    "retrying: %s",
+                    group_name,
+                )
+                time.sleep(0.3)
+
+            # Close any lingering search overlay before starting fresh
+            self._collapse_search_overlay()
+
+            if not self._do_search_and_select(group_name, 1.5 * delay_mult):
+                continue
+
+            # Verify that the correct group chat is now visible.
+            if self._verify_group_opened():
+                log.info(
+                    "Navigated to group%s: %s",
+                    " (retry)" if attempt else "", group_name,
+                )
+                self._current_group = group_name
+                return True
+
+        log.error("Navigation failed after retry: %s", group_name)
+        return False
 
-        # Close any lingering search overlay before starting fresh
-        self._collapse_search_overlay()
+    def _do_search_and_select(self, group_name: str, delay: float) -> bool:
+        """One search-box round: click, type the name, Down+Enter, dismiss.
 
-        # Click search box
+        *delay* paces both the post-typing settle and the post-Enter wait.
+        Returns True if the sequence completed (not whether the group
+        actually opened — callers verify separately).
+        """
         search_box = self._find_search_box()
         if not search_box:
             log.error("Search box not found.")
@@ -280,12 +462,9 @@ class DingTalkController:
             return False
 
         # Clear any previous text and type group name.
-        pyautogui.hotkey("ctrl", "a")
-        time.sleep(0.1)
-        pyautogui.press("delete")
-        time.sleep(0.2)
+        clear_text(search_box)
 
-        if not set_text(search_box, group_name, delay_after=1.5):
+        if not set_text(search_box, group_name, delay_after=delay):
             log.error("Failed to type group name: %s", group_name)
             self._collapse_search_overlay()
             return False
@@ -297,58 +476,17 @@ class DingTalkController:
         pyautogui.press("down")
         time.sleep(0.4)
         pyautogui.press("enter")
-        time.sleep(1.5)
+        # The chat renders behind the overlay; poll for its header rather
+        # than sleeping the full pacing delay.
+        wait_until(self._probe_group_header, timeout=max(delay, 2.0))
 
         # Dismiss the search overlay.  The "Collapse (esc)" button is a UIA
         # ButtonControl that appears in the top-left of the search overlay.
-        collapsed = self._collapse_search_overlay()
-        if not collapsed:
+        if not self._collapse_search_overlay():
             # Fallback: use Escape
             send_escape()
         time.sleep(0.5)
-
-        # Verify that the correct group chat is now visible.
-        if self._verify_group_opened():
-            log.info("Navigated to group: %s", group_name)
-            return True
-
-        # Retry with a fresh search
-        log.warning(
-            "Group chat may not be open after first attempt; retrying: %s",
-            group_name,
-        )
-        self._collapse_search_overlay()
-        time.sleep(0.3)
-
-        search_box2 = self._find_search_box()
-        if not search_box2:
-            return False
-        if not safe_click(search_box2, delay_after=0.5):
-            return False
-
-        pyautogui.hotkey("ctrl", "a")
-        time.sleep(0.1)
-        pyautogui.press("delete")
-        time.sleep(0.2)
-
-        if not set_text(search_box2, group_name, delay_after=2.0):
-            self._collapse_search_overlay()
-            return False
-
-        pyautogui.press("down")
-        time.sleep(0.4)
-        pyautogui.press("enter")
-        time.sleep(2.0)
-
-        self._collapse_search_overlay()
-        time.sleep(0.5)
-
-        if self._verify_group_opened():
-            log.info("Navigated to group (retry): %s", group_name)
-            return True
-
-        log.error("Navigation failed after retry: %s", group_name)
-        return False
+        return True
 
     def _collapse_search_overlay(self) -> bool:
         """Close the DingTalk search overlay.
@@ -356,44 +494,50 @@ class DingTalkController:
         The search overlay shows a keyboard hint "ESC to Dismiss" at the
         bottom.  Pressing Escape once clears the query text; pressing Escape
         a second time (when the query is already empty) dismisses the overlay
-        entirely.  We press Escape up to three times to handle both states.
+        entirely.  Escape is pressed up to three times, re-probing after
+        each press and stopping as soon as the overlay is gone.
 
         Returns True if the overlay was open and a close action was performed.
         """
         if not self._window:
             return False
 
+        # The retry path calls this back-to-back; trust a fresh negative.
+        if time.monotonic() < self._overlay_absent_until:
+            return False
+
+        # The overlay covers the chat pane; a header handle cached while
+        # it was up (or its cached absence) is unreliable.
+        self._ctrl_cache.pop(("group_header",), None)
+
         # Check if the overlay is open at all
-        collapse_btn = find_control(
-            self._window,
-            "ButtonControl",
-            timeout=0.5,
-            Name="Collapse (esc)",
-        )
-        if not collapse_btn:
+        if not self._overlay_present(timeout=0.5):
+            self._overlay_absent_until = time.monotonic() + 0.25
             return False  # Overlay not open, nothing to do
 
-        log.debug(
-            "Search overlay is open; pressing Escape twice to dismiss.",
-        )
-        try:
-            self._window.SetActive()
-            self._window.SetFocus()
-        except Exception:
-            pass
+        log.debug("Search overlay is open; pressing Escape to dismiss.")
+        self._focus_window()
 
-        # First Escape: clears the search query
-        pyautogui.press("escape")
-        time.sleep(0.4)
-        # Second Escape: dismisses the overlay when query is already empty
-        pyautogui.press("escape")
-        time.sleep(0.4)
-        # Third Escape: extra safety for stubborn states
-        pyautogui.press("escape")
-        time.sleep(0.5)
+        # Escape once per state (query text → overlay → stubborn extras),
+        # returning as soon as the overlay is actually gone.
+        for _ in range(3):
+            pyautogui.press("escape")
+            time.sleep(0.15)
+            if not self._overlay_present(timeout=0.2):
+                break
+        self._overlay_absent_until = time.monotonic() + 0.25
 
         return True
 
+    def _overlay_present(self, timeout: float = 0.2) -> bool:
+        """Quick probe for the search overlay's Collapse button."""
+        return find_control(
+            self._window,
+            "ButtonControl",
+            timeout=timeout,
+            Name="Collapse (esc)",
+        ) is not None
+
     def _verify_group_opened(self) -> bool:
         """Check whether a group conversation is currently open.
 
@@ -402,25 +546,43 @@ class DingTalkController:
         gone") was too permissive: DingTalk's contacts/search pages also have
         no welcome screen, causing false positives.
         """
-        positive_signals = (
-            "Files", "Group Settings", "Group Notice", "Chat History",
-            # Chinese UI variants
-            "文件", "群设置", "群公告", "聊天记录",
+        # Negative results are cached for 500 ms so the retry path in
+        # navigate_to_group doesn't immediately re-run the full probe.
+        btn = self._cached_find(
+            ("group_header",), self._probe_group_header, negative_ttl=0.5,
         )
-        for btn_name in positive_signals:
-            btn = find_control(
-                self._window, "ButtonControl", timeout=2, Name=btn_name,
-            )
-            if btn:
-                log.debug("Group header button found: %s", btn_name)
-                return True
+        return btn is not None
+
+    _POSITIVE_SIGNALS = frozenset((
+        "Files", "Group Settings", "Group Notice", "Chat History",
+        # Chinese UI variants
+        "文件", "群设置", "群公告", "聊天记录",
+    ))
+
+    def _probe_group_header(self) -> Optional[auto.Control]:
+        """Find any group-header button, or None if no group is open.
+
+        Walks the window subtree once and set-matches button names instead
+        of running one 2 s timed search per candidate — the failure case
+        drops from ~16 s of sequential timeouts to a single enumeration.
+        """
+        for ctrl in self._iter_descendants(self._window, max_depth=10):
+            try:
+                if (
+                    ctrl.ControlTypeName == "ButtonControl"
+                    and ctrl.Name in self._POSITIVE_SIGNALS
+                ):
+                    log.debug("Group header button found: %s", ctrl.Name)
+                    return ctrl
+            except Exception:
+                continue
 
         log.debug(
             "_verify_group_opened: no group header buttons found "
             "(tried: %s).",
-            positive_signals,
+            sorted(self._POSITIVE_SIGNALS),
         )
-        return False
+        return None
 
     # ── Files Tab ────────────────────────────────────────────
 
@@ -434,33 +596,41 @@ class DingTalkController:
         if not self._window:
             return False
 
+        # Opening the tab swaps the chat pane for the file view.
+        self._ctrl_cache.pop(("file_grid",), None)
+
         sel = self.sel.files_tab
         names_to_try = [sel.name] if sel.name else []
         # Add common alternatives for English/Chinese UI
         for alt in ("Files", "File", "文件"):
             if alt not in names_to_try:
                 names_to_try.append(alt)
+        wanted = frozenset(names_to_try)
 
+        # One subtree walk matching every candidate name at once instead of
+        # a timed find_control probe per name x control type (up to ~30 s
+        # on a missing tab).  The configured control type wins over the
+        # fallback type when both match.
         tab = None
-        for name in names_to_try:
-            tab = find_control(
-                self._window,
-                sel.control_type,
-                timeout=self.dt.timeout / 2,
-                Name=name,
-            )
-            if tab:
+        fallback_tab = None
+        for ctrl in self._iter_descendants(self._window, max_depth=10):
+            try:
+                if not ctrl.Name or ctrl.Name not in wanted:
+                    continue
+                type_name = ctrl.ControlTypeName
+            except Exception:
+                continue
+            if type_name == sel.control_type:
+                tab = ctrl
                 break
-            # Try fallback control type
-            if sel.fallback_control_type:
-                tab = find_control(
-                    self._window,
-                    sel.fallback_control_type,
-                    timeout=2,
-                    Name=name,
-                )
-                if tab:
-                    break
+            if (
+                fallback_tab is None
+                and sel.fallback_control_type
+                and type_name == sel.fallback_control_type
+            ):
+                fallback_tab = ctrl
+        if tab is None:
+            tab = fallback_tab
 
         if not tab:
             log.error("Files tab not found (tried names: %s).", names_to_try)
@@ -472,7 +642,10 @@ class DingTalkController:
         cx = (rect.left + rect.right) // 2
         cy = (rect.top + rect.bottom) // 2
         pyautogui.click(cx, cy)
-        time.sleep(1.5)
+        # The grid appearing is the real signal that the tab switched;
+        # polling for it also primes the control cache for list_files.
+        if not wait_until(self._find_file_grid, timeout=3.0):
+            log.debug("File grid not visible yet after opening files tab.")
 
         log.info("Opened files tab.")
         return True
@@ -480,32 +653,32 @@ class DingTalkController:
     # ── File Listing ─────────────────────────────────────────
 
     def _find_file_grid(self) -> Optional[auto.Control]:
-        """Locate the 'grid' GroupControl inside the file view.
+        """Locate the file grid (cached across the per-file download loop)."""
+        return self._cached_find(("file_grid",), self._locate_file_grid)
+
+    def _locate_file_grid(self) -> Optional[auto.Control]:
+        """Walk the UIA tree for the 'grid' GroupControl inside the file view.
 
         The grid can appear in two layouts:
         - Current: GroupControl Name='grid' directly accessible from the window
         - Legacy: inside DocumentControl(Chrome_RenderWidgetHostHWND) → GroupControl Name='grid'
+
+        One breadth-first pass covers both: the first GroupControl named
+        'grid' wins regardless of depth or parent, so the legacy layout no
+        longer pays a dt.timeout direct-search before its fallback probe.
+        Depth 20 matches the old two-stage legacy search (DocumentControl
+        at up to 10 from the window, then 'grid' up to 10 below that).
         """
         try:
-            # Try direct search first (current DtMainFrameView layout)
-            grid = find_control(
-                self._window, "GroupControl",
-                timeout=self.dt.timeout, Name="grid",
-            )
-            if grid:
-                return grid
-
-            # Legacy: inside DocumentControl
-            doc = find_control(
-                self._window, "DocumentControl",
-                timeout=3, ClassName="Chrome_RenderWidgetHostHWND",
-            )
-            if doc:
-                grid = find_control(
-                    doc, "GroupControl", timeout=3, Name="grid",
-                )
-                if grid:
-                    return grid
+            for ctrl in self._iter_descendants(self._window, max_depth=20):
+                try:
+                    if (
+                        ctrl.ControlTypeName == "GroupControl"
+                        and ctrl.Name == "grid"
+                    ):
+                        return ctrl
+                except Exception:
+                    continue
 
             log.debug("File grid not found in any known layout.")
             return None
@@ -518,16 +691,19 @@ class DingTalkController:
         """Extract the filename from a CustomControl Name like:
         '  250702GMF.PDF 1.1 MB  ·2025/07/02 13:52沧海一土狗'
         """
-        import re
-        cleaned = raw_name.replace("\xa0", " ").strip()
+        cleaned = raw_name.translate(_NBSP_TABLE).strip()
         # Match: filename.ext  size_number size_unit
-        m = re.match(r"(.+?\.\w+)\s+[\d.]+ [KMGT]?B", cleaned)
+        m = _FILENAME_RE.match(cleaned)
         if m:
             return m.group(1).strip()
         return cleaned
 
     @staticmethod
-    def _parse_timestamp(raw_name: str) -> Optional[str]:
+    def _parse_timestamp(
+        raw_name: str,
+        today_str: Optional[str] = None,
+        yday_str: Optional[str] = None,
+    ) -> Optional[str]:
         """Extract the upload timestamp from a file row Name.
 
         DingTalk uses relative date labels for recent files:
@@ -536,31 +712,36 @@ class DingTalkController:
         - Older:     '·2025/07/02 13:52AuthorName'
 
         All are normalised to 'YYYY/MM/DD HH:MM' for consistent comparison.
+        *today_str*/*yday_str* let batch callers (list_files) compute the
+        date strings once instead of per row.
         Returns None if no timestamp can be parsed.
         """
-        import re
-        from datetime import datetime, timedelta
-
         # Pattern 1: absolute date  ·YYYY/MM/DD HH:MM
-        m = re.search(r"(\d{4}/\d{2}/\d{2}\s+\d{2}:\d{2})", raw_name)
+        m = _ABS_TS_RE.search(raw_name)
         if m:
             return m.group(1)
 
         # Pattern 2: ·Today HH:MM
-        m = re.search(r"·Today\s+(\d{2}:\d{2})", raw_name)
+        m = _TODAY_RE.search(raw_name)
         if m:
-            today = datetime.now().strftime("%Y/%m/%d")
+            today = today_str or datetime.now().strftime("%Y/%m/%d")
             return f"{today} {m.group(1)}"
 
         # Pattern 3: ·Yesterday HH:MM
-        m = re.search(r"·Yesterday\s+(\d{2}:\d{2})", raw_name)
+        m = _YDAY_RE.search(raw_name)
         if m:
-            yesterday = (datetime.now() - timedelta(days=1)).strftime("%Y/%m/%d")
+            yesterday = yday_str or (
+                datetime.now() - timedelta(days=1)
+            ).strftime("%Y/%m/%d")
             return f"{yesterday} {m.group(1)}"
 
         return None
 
-    def list_files(self, max_scrolls: int = 30) -> List[FileInfo]:
+    def list_files(
+        self,
+        max_scrolls: int = 30,
+        scan_mode: Literal["top", "full"] = "full",
+    ) -> List[FileInfo]:
         """Enumerate visible files in the files tab.
 
         The file grid has two possible structures:
@@ -569,9 +750,12 @@ class DingTalkController:
 
         Args:
             max_scrolls: How many scroll-down iterations to perform to load
-                files.  Use a small value (e.g. 3) for incremental checks
-                where only the newest files at the top of the list matter.
-                Use a large value (e.g. 30) for a full scan.
+                files ("full" mode only).  Use a large value (e.g. 30) for
+                a complete scan.
+            scan_mode: "full" scrolls through the whole list; "top"
+                enumerates only the initially visible viewport — newest
+                files sit at the top, so incremental checks don't need to
+                pay for a scroll round-trip over the entire history.
 
         Returns a list of FileInfo with name and control reference.
         """
@@ -583,27 +767,44 @@ class DingTalkController:
             log.warning("File list control not found.")
             return []
 
-        # Scroll the grid to load files
-        scroll_to_bottom(grid, max_scrolls=max_scrolls)
-        time.sleep(0.5)
+        if scan_mode == "full":
+            # Scroll the grid to load files
+            scroll_to_bottom(grid, max_scrolls=max_scrolls)
+            time.sleep(0.5)
 
         # Collect all candidate controls — file rows may be direct children
-        # of the grid or nested inside a container GroupControl.
-        candidates: list = []
+        # of the grid or nested inside a container GroupControl.  Every
+        # property read (.Name) is a cross-process COM call, and this
+        # binding exposes no IUIAutomationCacheRequest, so fetch Name
+        # exactly once per control here and carry it as a plain string.
+        # Grids that mix both layouts expose the same row twice; dedupe
+        # on the raw Name here so the parse loop never sees repeats.
+        candidates: List[Tuple[str, auto.Control]] = []
+        seen_raw: set = set()
         for child in grid.GetChildren():
-            if child.Name and child.Name.strip():
-                candidates.append(child)
+            name = child.Name
+            if name and name.strip():
+                raw = name.strip()
+                if raw not in seen_raw:
+                    seen_raw.add(raw)
+                    candidates.append((raw, child))
             else:
                 # Unnamed container — check its children for file rows
                 for sub in child.GetChildren():
-                    if sub.Name and sub.Name.strip():
-                        candidates.append(sub)
+                    sub_name = sub.Name
+                    if sub_name and sub_name.strip():
+                        raw = sub_name.strip()
+                        if raw not in seen_raw:
+                            seen_raw.add(raw)
+                            candidates.append((raw, sub))
 
         # Parse filenames and timestamps from candidate controls
         files: List[FileInfo] = []
         seen_names: set = set()
-        for ctrl in candidates:
-            raw = ctrl.Name.strip()
+        now = datetime.now()
+        today_str = now.strftime("%Y/%m/%d")
+        yday_str = (now - timedelta(days=1)).strftime("%Y/%m/%d")
+        for raw, ctrl in candidates:
             fname = self._parse_filename(raw)
             if not fname or fname in seen_names:
                 continue
@@ -611,14 +812,26 @@ class DingTalkController:
             if "Last update:" in raw and "." not in fname.split()[-1]:
                 continue
             seen_names.add(fname)
-            ts = self._parse_timestamp(raw)
+            ts = self._parse_timestamp(raw, today_str, yday_str)
             files.append(FileInfo(name=fname, control=ctrl, timestamp=ts))
 
         log.info("Found %d files in list.", len(files))
 
-        # Scroll back to top so newest files are visible for interaction
-        scroll_to_top(grid, max_scrolls=max_scrolls + 5)
-        time.sleep(0.3)
+        if scan_mode == "full":
+            # Scroll back to top so newest files are visible for interaction.
+            # SetScrollPercent is a single O(1) IPC call (-1 = leave the
+            # horizontal axis untouched); the iterative helper covers grids
+            # where the pattern is missing or the call reports failure.
+            restored = False
+            try:
+                sp = grid.GetScrollPattern()
+                if sp:
+                    restored = bool(sp.SetScrollPercent(-1, 0))
+            except Exception:
+                restored = False
+            if not restored:
+                scroll_to_top(grid, max_scrolls=max_scrolls + 5)
+            time.sleep(0.3)
 
         return files
 
@@ -631,6 +844,7 @@ class DingTalkController:
         """
         rect = file_info.control.BoundingRectangle
         if rect.width() > 0 and rect.height() > 0:
+            file_info.rect = (rect.left, rect.top, rect.right, rect.bottom)
             return True
 
         # Try ScrollItemPattern to bring the control into view
@@ -641,6 +855,9 @@ class DingTalkController:
                 time.sleep(0.5)
                 rect = file_info.control.BoundingRectangle
                 if rect.width() > 0 and rect.height() > 0:
+                    file_info.rect = (
+                        rect.left, rect.top, rect.right, rect.bottom,
+                    )
                     return True
         except Exception:
             pass
@@ -650,6 +867,18 @@ class DingTalkController:
         )
         return False
 
+    @staticmethod
+    def _fetch_rect(file_info: FileInfo) -> Optional[Tuple[int, int, int, int]]:
+        """Read the row's BoundingRectangle once and cache it on the FileInfo."""
+        try:
+            rect = file_info.control.BoundingRectangle
+            if rect.width() <= 0 or rect.height() <= 0:
+                return None
+            file_info.rect = (rect.left, rect.top, rect.right, rect.bottom)
+            return file_info.rect
+        except Exception:
+            return None
+
     def download_file(self, file_info: FileInfo) -> bool:
         """Download a file.  Tries multiple strategies in order.
 
@@ -666,6 +895,8 @@ class DingTalkController:
             log.error("File not visible, cannot download: %s", file_info.name)
             return False
 
+        self._hover_shot = None  # prefetched per file by strategy 1
+
         # Strategy 1 (primary): hover → click at fixed offset from right edge
         if self._download_via_hover_offset(file_info):
             return True
@@ -700,22 +931,17 @@ class DingTalkController:
         BoundingRectangle, with the download icon (↓) very close to it.
         """
         try:
-            rect = file_info.control.BoundingRectangle
-            if rect.width() <= 0 or rect.height() <= 0:
+            rect = file_info.rect or self._fetch_rect(file_info)
+            if not rect:
                 log.debug("File row has no valid BoundingRectangle for hover offset.")
                 return False
+            left, top, right, bottom = rect
 
-            row_cx = (rect.left + rect.right) // 2
-            row_cy = (rect.top + rect.bottom) // 2
+            row_cx = (left + right) // 2
+            row_cy = (top + bottom) // 2
 
             # Ensure DingTalk is focused
-            if self._window:
-                try:
-                    self._window.SetActive()
-                    self._window.SetFocus()
-                    time.sleep(0.3)
-                except Exception:
-                    pass
+            self._focus_window()
 
             # Step 1: Hover over the file row center to trigger icon appearance
             log.debug(
@@ -725,16 +951,31 @@ class DingTalkController:
             pyautogui.moveTo(row_cx, row_cy)
             time.sleep(1.0)  # wait for hover action icons to render
 
+            # The hover icons are rendered right now — grab the row area for
+            # the VLM fallback so a strategy-2 recovery can skip its own
+            # hover + settle + capture round-trip.
+            if self.cfg.vlm.api_key:
+                try:
+                    region = (
+                        max(0, left - 20),
+                        max(0, top - 10),
+                        right + self.cfg.vlm.capture_margin,
+                        bottom + 10,
+                    )
+                    self._hover_shot = (grab_screenshot_base64(region, compress_level=1), region)
+                except Exception as exc:
+                    log.debug("Hover screenshot prefetch failed: %s", exc)
+
             # Step 2: Click at fixed offset to the LEFT of the row's right edge.
             # The download icon (↓) sits near the right edge of the row's
             # BoundingRectangle, typically ~8 px to the left of rect.right.
             offset = self.dt.download_icon_offset
-            click_x = rect.right - offset
+            click_x = right - offset
             click_y = row_cy
             log.info(
                 "Hover-offset: clicking download icon at (%d, %d) "
                 "(right_edge=%d - offset=%d) for %s",
-                click_x, click_y, rect.right, offset, file_info.name,
+                click_x, click_y, right, offset, file_info.name,
             )
             pyautogui.click(click_x, click_y)
 
@@ -766,53 +1007,53 @@ class DingTalkController:
         4. Send screenshot to VLM → get (x, y) of download icon.
         5. Click at those coordinates (icon is near the row, so mouse moves little).
         """
-        from .vlm import find_icon_coords, grab_screenshot_base64
-
         vlm_cfg = self.cfg.vlm
         if not vlm_cfg.api_key:
             log.debug("VLM API key not configured, skipping hover strategy.")
             return False
 
         try:
-            rect = file_info.control.BoundingRectangle
-            if rect.width() <= 0 or rect.height() <= 0:
-                log.debug("File row has no valid BoundingRectangle for hover.")
-                return False
-
-            row_cx = (rect.left + rect.right) // 2
-            row_cy = (rect.top + rect.bottom) // 2
-
-            # Ensure DingTalk is focused
-            if self._window:
-                try:
-                    self._window.SetActive()
-                    self._window.SetFocus()
-                    time.sleep(0.3)
-                except Exception:
-                    pass
+            # Reuse the screenshot prefetched while strategy 1 was hovering —
+            # the icons were visible then, so no need to re-hover and wait.
+            prefetched, self._hover_shot = self._hover_shot, None
+            if prefetched:
+                screenshot_b64, region = prefetched
+                cap_left, cap_top, cap_right, cap_bottom = region
+                log.debug("Using prefetched hover screenshot for %s.", file_info.name)
+            else:
+                rect = file_info.rect or self._fetch_rect(file_info)
+                if not rect:
+                    log.debug("File row has no valid BoundingRectangle for hover.")
+                    return False
+                left, top, right, bottom = rect
+
+                row_cx = (left + right) // 2
+                row_cy = (top + bottom) // 2
+
+                # Ensure DingTalk is focused
+                self._focus_window()
+
+                # Step 1: Hover over the file row center
+                log.debug(
+                    "Hovering over file row at (%d, %d) for %s",
+                    row_cx, row_cy, file_info.name,
+                )
+                pyautogui.moveTo(row_cx, row_cy)
+                time.sleep(1.5)  # wait for hover action icons to render
 
-            # Step 1: Hover over the file row center
-            log.debug(
-                "Hovering over file row at (%d, %d) for %s",
-                row_cx, row_cy, file_info.name,
-            )
-            pyautogui.moveTo(row_cx, row_cy)
-            time.sleep(1.5)  # wait for hover action icons to render
-
-            # Step 2: Screenshot the row area + generous right margin for icons
-            margin = vlm_cfg.capture_margin
-            # Capture the full row width plus extra right margin for hover icons
-            cap_left = max(0, rect.left - 20)
-            cap_top = max(0, rect.top - 10)
-            cap_right = rect.right + margin  # icons appear on the right
-            cap_bottom = rect.bottom + 10
-            region = (cap_left, cap_top, cap_right, cap_bottom)
+                # Step 2: Screenshot the row area + right margin for icons
+                margin = vlm_cfg.capture_margin
+                cap_left = max(0, left - 20)
+                cap_top = max(0, top - 10)
+                cap_right = right + margin  # icons appear on the right
+                cap_bottom = bottom + 10
+                region = (cap_left, cap_top, cap_right, cap_bottom)
 
-            screenshot_b64 = grab_screenshot_base64(region)
-            log.debug(
-                "Captured hover row screenshot (%dx%d) at (%d,%d).",
-                cap_right - cap_left, cap_bottom - cap_top, cap_left, cap_top,
-            )
+                screenshot_b64 = grab_screenshot_base64(region, compress_level=1)
+                log.debug(
+                    "Captured hover row screenshot (%dx%d) at (%d,%d).",
+                    cap_right - cap_left, cap_bottom - cap_top, cap_left, cap_top,
+                )
 
             # Step 3: Ask VLM to find the download icon
             img_w = cap_right - cap_left
@@ -853,6 +1094,40 @@ class DingTalkController:
 
     # ── VLM Right-Click Download (fallback) ───────────────────
 
+    @staticmethod
+    def _wait_for_menu(max_wait: float = 1.0) -> bool:
+        """Wait for a context menu to render after a right-click.
+
+        Polls for a top-level MenuControl instead of sleeping a fixed
+        second — on a warm machine the menu is up within ~150 ms.
+        Returns True once a menu exists, False after *max_wait*.
+        """
+        def probe() -> bool:
+            try:
+                return auto.MenuControl(searchDepth=3).Exists(0.05, 0.05)
+            except Exception:
+                return False
+
+        return wait_until(probe, timeout=max_wait, interval=0.05) is not None
+
+    @staticmethod
+    def _menu_capture_region(cx: int, cy: int) -> Tuple[int, int, int, int]:
+        """Tight capture rectangle for a context menu opened at (cx, cy).
+
+        Menus drop down-right of the cursor; near the screen's right or
+        bottom edge they flip, so the rectangle flips with them.
+        """
+        screen_w, screen_h = pyautogui.size()
+        if cx + _MENU_CAP_W <= screen_w:
+            left, right = cx, cx + _MENU_CAP_W
+        else:
+            left, right = max(0, cx - _MENU_CAP_W), cx
+        if cy + _MENU_CAP_H <= screen_h:
+            top, bottom = cy, cy + _MENU_CAP_H
+        else:
+            top, bottom = max(0, cy - _MENU_CAP_H), cy
+        return left, top, right, bottom
+
     def _download_via_vlm(self, file_info: FileInfo) -> bool:
         """Right-click → screenshot context menu → VLM locates 'Download' → click.
 
@@ -861,44 +1136,35 @@ class DingTalkController:
         3. Send to Qwen-VL-Plus via OpenRouter to get the (x, y) of "Download".
         4. Click at those coordinates.
         """
-        from .vlm import find_menu_item_coords, grab_screenshot_base64
-
         vlm_cfg = self.cfg.vlm
         if not vlm_cfg.api_key:
             log.debug("VLM API key not configured, skipping VLM strategy.")
             return False
 
         try:
-            rect = file_info.control.BoundingRectangle
-            if rect.width() <= 0 or rect.height() <= 0:
+            rect = file_info.rect or self._fetch_rect(file_info)
+            if not rect:
                 log.debug("File row has no valid BoundingRectangle.")
                 return False
+            left, top, right, bottom = rect
 
-            row_cx = (rect.left + rect.right) // 2
-            row_cy = (rect.top + rect.bottom) // 2
+            row_cx = (left + right) // 2
+            row_cy = (top + bottom) // 2
 
             # Ensure DingTalk is focused
-            if self._window:
-                try:
-                    self._window.SetActive()
-                    self._window.SetFocus()
-                    time.sleep(0.3)
-                except Exception:
-                    pass
+            self._focus_window()
 
             # Step 1: Right-click with real mouse
             pyautogui.rightClick(row_cx, row_cy)
-            time.sleep(1.0)  # wait for context menu to render
-
-            # Step 2: Capture region around the right-click point
-            margin = vlm_cfg.capture_margin
-            cap_left = max(0, row_cx - margin)
-            cap_top = max(0, row_cy - margin)
-            cap_right = row_cx + margin
-            cap_bottom = row_cy + margin
+            self._wait_for_menu()
+
+            # Step 2: Capture a tight rectangle where the menu dropped
+            cap_left, cap_top, cap_right, cap_bottom = (
+                self._menu_capture_region(row_cx, row_cy)
+            )
             region = (cap_left, cap_top, cap_right, cap_bottom)
 
-            screenshot_b64 = grab_screenshot_base64(region)
+            screenshot_b64 = grab_screenshot_base64(region, compress_level=1)
             log.debug(
                 "Captured context menu screenshot (%dx%d) at (%d,%d).",
                 cap_right - cap_left, cap_bottom - cap_top, cap_left, cap_top,
@@ -974,20 +1240,45 @@ class DingTalkController:
         time.sleep(self.dt.download_wait)
         return True
 
+    _SAVE_BUTTON_NAMES = frozenset(("Save", "保存", "OK", "确定"))
+
+    def _find_any_button(
+        self,
+        root: auto.Control,
+        names: frozenset,
+        timeout: float,
+    ) -> Optional[auto.Control]:
+        """Poll for the first button under *root* whose Name is in *names*.
+
+        One subtree walk per poll matches every candidate name at once,
+        instead of one timed find_control search per name — the no-dialog
+        case costs a single enumeration per poll rather than len(names)
+        sequential timeouts.
+        """
+        def probe() -> Optional[auto.Control]:
+            for ctrl in self._iter_descendants(root, max_depth=10):
+                try:
+                    if (
+                        ctrl.ControlTypeName == "ButtonControl"
+                        and ctrl.Name in names
+                    ):
+                        return ctrl
+                except Exception:
+                    continue
+            return None
+
+        return wait_until(probe, timeout=timeout, interval=0.1)
+
     def _handle_save_dialog(self) -> None:
         """Check for and dismiss any save/download confirmation dialog."""
-        time.sleep(0.5)
-        for btn_name in ("Save", "保存", "OK", "确定"):
-            btn = find_control(
-                auto.GetRootControl(),
-                "ButtonControl",
-                timeout=1,
-                Name=btn_name,
-            )
-            if btn:
-                log.debug("Dismissing save dialog with button: %s", btn_name)
-                safe_click(btn)
-                return
+        btn = self._find_any_button(
+            auto.GetRootControl(), self._SAVE_BUTTON_NAMES, timeout=1.0,
+        )
+        if btn:
+            log.debug("Dismissing save dialog with button: %s", btn.Name)
+            safe_click(btn)
+            # The dialog held focus; force a refocus before the next input.
+            self._last_focus_ts = 0.0
 
     # ── Dialog Dismissal ─────────────────────────────────────
 
@@ -995,30 +1286,36 @@ class DingTalkController:
         """Dismiss update/notification popups by looking for known button texts.
 
         Repeats up to *max_rounds* times so stacked dialogs are handled,
-        but cannot loop forever if a button keeps reappearing.
+        but cannot loop forever if a button keeps reappearing.  Each round
+        walks the window subtree once and set-matches every configured
+        button name, instead of running one timed search per text.
         """
         if not self._window:
             return
 
+        if self._dismiss_set is None:
+            self._dismiss_set = frozenset(self.sel.dismiss_buttons)
+        if not self._dismiss_set:
+            return
+
         for _round in range(max_rounds):
             dismissed = False
-            for btn_text in self.sel.dismiss_buttons:
-                # Use a short timeout (0.3 s) — we just want a quick check,
-                # not a full 1-second wait per button text.  Reducing this
-                # from 1 s → 0.3 s cuts dismiss_dialogs from ~8 s/round
-                # to ~2.4 s/round.
-                btn = find_control(
-                    self._window,
-                    "ButtonControl",
-                    timeout=0.3,
-                    Name=btn_text,
-                )
-                if btn:
-                    log.info("Dismissing dialog with button: %s", btn_text)
-                    safe_click(btn, delay_after=0.3)
-                    dismissed = True
+            for ctrl in self._iter_descendants(self._window, max_depth=10):
+                try:
+                    if (
+                        ctrl.ControlTypeName != "ButtonControl"
+                        or ctrl.Name not in self._dismiss_set
+                    ):
+                        continue
+                except Exception:
+                    continue
+                log.info("Dismissing dialog with button: %s", ctrl.Name)
+                safe_click(ctrl, delay_after=0.3)
+                dismissed = True
             if not dismissed:
                 break
+            # A dismissed dialog had focus — invalidate the focus cache.
+            self._last_focus_ts = 0.0
 
     # ── Chat Attachment Download ──────────────────────────────
 
@@ -1084,7 +1381,7 @@ class DingTalkController:
 
         # Right-click the image center
         pyautogui.rightClick(cx, cy)
-        time.sleep(1.0)
+        self._wait_for_menu()
 
         # Strategy 1: UIA MenuItemControl Name='Download'
         sel = self.sel.context_menu_download
@@ -1104,19 +1401,15 @@ class DingTalkController:
                 return True
 
         # Strategy 2: VLM fallback for context menu
-        from .vlm import find_menu_item_coords, grab_screenshot_base64
-
         vlm_cfg = self.cfg.vlm
         if vlm_cfg.api_key:
             try:
-                margin = vlm_cfg.capture_margin
-                cap_left = max(0, cx - margin)
-                cap_top = max(0, cy - margin)
-                cap_right = cx + margin
-                cap_bottom = cy + margin
+                cap_left, cap_top, cap_right, cap_bottom = (
+                    self._menu_capture_region(cx, cy)
+                )
                 region = (cap_left, cap_top, cap_right, cap_bottom)
 
-                screenshot_b64 = grab_screenshot_base64(region)
+                screenshot_b64 = grab_screenshot_base64(region, compress_level=1)
                 img_w = cap_right - cap_left
                 img_h = cap_bottom - cap_top
 
@@ -1150,8 +1443,23 @@ class DingTalkController:
 
     # ── Public helpers for optimized scan loop ───────────────
 
+    @staticmethod
+    def _encode_grab_jpeg(img) -> str:
+        """JPEG-encode an mss grab and return it as base64.
+
+        JPEG at quality 85 encodes ~5-10x faster than zlib-based PNG and
+        produces a 3-5x smaller payload, with no practical loss for
+        button/filename detection downstream.
+        """
+        from PIL import Image
+
+        pil = Image.frombytes("RGB", img.size, img.rgb)
+        buf = io.BytesIO()
+        pil.save(buf, "JPEG", quality=85)
+        return base64.standard_b64encode(buf.getvalue()).decode()
+
     def get_chat_panel_screenshot(self) -> Tuple[str, int, int]:
-        """Capture the chat panel as a base64 PNG.
+        """Capture the chat panel as a base64 JPEG.
 
         Uses mss (DirectX-based) instead of pyautogui so that DingTalk's
         hardware-accelerated CefBrowserWindow (chat messages) is captured
@@ -1161,20 +1469,17 @@ class DingTalkController:
         image size sent to Claude by ~30 %.
 
         Returns:
-            (base64_png, offset_x, offset_y) where offset_x/offset_y is the
+            (base64_jpeg, offset_x, offset_y) where offset_x/offset_y is the
             top-left corner of the crop in screen coordinates.  Add these to
             any image-relative coordinates returned by ChatScanner to get
             screen-absolute values for pyautogui.click().
         """
-        import mss
-        import mss.tools
+        from .vlm import _get_sct
 
+        sct = _get_sct()
         if not self._window:
-            with mss.mss() as sct:
-                monitor = sct.monitors[1]
-                img = sct.grab(monitor)
-                png = mss.tools.to_png(img.rgb, img.size)
-            return base64.standard_b64encode(png).decode(), 0, 0
+            img = sct.grab(sct.monitors[1])
+            return self._encode_grab_jpeg(img), 0, 0
 
         rect = self._window.BoundingRectangle
         # Skip the left sidebar (chat/contact list, ~30 % of window width)
@@ -1184,12 +1489,9 @@ class DingTalkController:
         height = rect.bottom - chat_top
 
         monitor = {"left": chat_left, "top": chat_top, "width": width, "height": height}
-        with mss.mss() as sct:
-            img = sct.grab(monitor)
-            png = mss.tools.to_png(img.rgb, img.size)
+        img = sct.grab(monitor)
 
-        b64 = base64.standard_b64encode(png).decode()
-        return b64, chat_left, chat_top
+        return self._encode_grab_jpeg(img), chat_left, chat_top
 
     def click_download_at(self, x: int, y: int) -> None:
         """Click a Download button at screen-absolute coordinates.
@@ -1210,13 +1512,7 @@ class DingTalkController:
 
     def _ensure_focus(self) -> None:
         """Bring DingTalk window to foreground and set keyboard focus."""
-        if self._window:
-            try:
-                self._window.SetActive()
-                self._window.SetFocus()
-                time.sleep(0.3)
-            except Exception:
-                pass
+        self._focus_window()
 
     def _scroll_chat_up(self, clicks: int = 5) -> None:
         """Scroll the chat area up to load older messages.
@@ -11,6 +11,37 @@ import uiautomation as auto
 log = logging.getLogger("dd_collector")
 
 
+def wait_until(
+    predicate,
+    timeout: float,
+    interval: float = 0.05,
+    max_interval: float = 0.5,
+):
+    """Poll *predicate* until it returns a truthy value or *timeout* expires.
+
+    Replaces fixed ``time.sleep`` waits on the UI hot path: returns as soon
+    as the condition holds (fast machines win), while keeping the same
+    worst-case ceiling.  The poll interval backs off exponentially from
+    *interval* to *max_interval* so a long wait doesn't spin.
+
+    Returns the predicate's truthy result, or None on timeout.
+    """
+    deadline = time.monotonic() + timeout
+    delay = interval
+    while True:
+        try:
+            result = predicate()
+        except Exception as exc:
+            log.debug("wait_until predicate error: %s", exc)
+            result = None
+        if result:
+            return result
+        if time.monotonic() >= deadline:
+            return None
+        time.sleep(delay)
+        delay = min(delay * 1.5, max_interval)
+
+
 def find_control(
     parent: auto.Control,
     control_type: str,
@@ -99,6 +130,29 @@ def set_text(control: auto.Control, text: str, delay_after: float = 0.5) -> bool
             return False
 
 
+def clear_text(control: auto.Control) -> bool:
+    """Clear an edit control via ValuePattern, falling back to Ctrl+A/Delete.
+
+    The ValuePattern call is a single synchronous COM round-trip, so no
+    settle sleep is needed; the keyboard fallback keeps the old pacing.
+    Returns True when the fast path was used.
+    """
+    try:
+        vp = control.GetValuePattern()
+        if vp:
+            vp.SetValue("")
+            return True
+    except Exception as exc:
+        log.debug("clear_text ValuePattern failed: %s", exc)
+    try:
+        control.SendKeys("{Ctrl}a")
+        control.SendKeys("{Delete}")
+        time.sleep(0.2)
+    except Exception as exc:
+        log.warning("clear_text fallback failed: %s", exc)
+    return False
+
+
 def scroll_to_bottom(control: auto.Control, max_scrolls: int = 50) -> None:
     """Scroll a control to the bottom using ScrollPattern, with PageDown fallback.
 
@@ -10,13 +10,49 @@ from __future__ import annotations
 import base64
 import logging
 import re
+import threading
 from typing import Optional, Tuple
 
 import mss
 import mss.tools
+from openai import OpenAI
 
 log = logging.getLogger("dd_collector")
 
+# Memoized OpenAI clients keyed by endpoint+key.  The client wraps an
+# httpx connection pool, so reusing it keeps the TLS connection to
+# OpenRouter alive across calls instead of paying a fresh handshake
+# (~100-300 ms) per lookup.  Clients are thread-safe; the lock only
+# guards first construction.
+_clients: dict = {}
+_clients_lock = threading.Lock()
+
+
+def _get_client(base_url: str, api_key: str) -> OpenAI:
+    key = (base_url, api_key)
+    client = _clients.get(key)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(key)
+            if client is None:
+                client = OpenAI(base_url=base_url, api_key=api_key)
+                _clients[key] = client
+    return client
+
+
+# One persistent mss grabber per thread: mss.mss() allocates GDI DC /
+# BitBlt handles that are expensive to set up and not thread-safe to
+# share, so each thread lazily opens its own and keeps it for reuse.
+_capture_local = threading.local()
+
+
+def _get_sct() -> "mss.base.MSSBase":
+    sct = getattr(_capture_local, "sct", None)
+    if sct is None:
+        sct = mss.mss()
+        _capture_local.sct = sct
+    return sct
+
 
 def _strip_thinking(text: str) -> str:
     """Remove <think>...</think> blocks from VLM responses.
@@ -30,28 +66,32 @@ def _strip_thinking(text: str) -> str:
 
 def grab_screenshot_base64(
     region: Optional[Tuple[int, int, int, int]] = None,
+    compress_level: int = 6,
 ) -> str:
     """Capture a screenshot and return it as a base64-encoded PNG string.
 
     Args:
         region: Optional (left, top, right, bottom) in screen pixels.
                 If None, captures the full primary monitor.
+        compress_level: zlib level for the PNG encode (0-9).  For small
+                row/menu crops the encode dominates the capture path;
+                level 1 is ~3x faster for ~10% larger payloads.
 
     Returns:
         Base64-encoded PNG data (no data-URI prefix).
     """
-    with mss.mss() as sct:
-        if region:
-            left, top, right, bottom = region
-            monitor = {"left": left, "top": top,
-                       "width": right - left, "height": bottom - top}
-        else:
-            monitor = sct.monitors[1]  # primary monitor
+    sct = _get_sct()
+    if region:
+        left, top, right, bottom = region
+        monitor = {"left": left, "top": top,
+                   "width": right - left, "height": bottom - top}
+    else:
+        monitor = sct.monitors[1]  # primary monitor
 
-        img = sct.grab(monitor)
-        # Convert to PNG bytes
-        png_bytes = mss.tools.to_png(img.rgb, img.size)
-        return base64.b64encode(png_bytes).decode("ascii")
+    img = sct.grab(monitor)
+    # Convert to PNG bytes
+    png_bytes = mss.tools.to_png(img.rgb, img.size, level=compress_level)
+    return base64.b64encode(png_bytes).decode("ascii")
 
 
 def _validate_coords(
@@ -108,9 +148,7 @@ def find_menu_item_coords(
     Returns:
         (x, y) screen coordinates of the menu item center, or None if not found.
     """
-    from openai import OpenAI
-
-    client = OpenAI(base_url=base_url, api_key=api_key)
+    client = _get_client(base_url, api_key)
 
     # Include image dimensions in the prompt so the VLM knows the coordinate space
     size_hint = ""
@@ -208,9 +246,7 @@ def find_icon_coords(
     Returns:
         (x, y) screen coordinates of the icon center, or None if not found.
     """
-    from openai import OpenAI
-
-    client = OpenAI(base_url=base_url, api_key=api_key)
+    client = _get_client(base_url, api_key)
 
     # Include image dimensions in the prompt so the VLM knows the coordinate space
     size_hint = ""
@@ -303,9 +339,7 @@ def find_image_attachments(
     Only returns actual shared image/photo/screenshot attachments — not
     user avatars, UI icons, stickers, or file cards.
     """
-    from openai import OpenAI
-
-    client = OpenAI(base_url=base_url, api_key=api_key)
+    client = _get_client(base_url, api_key)
 
     size_hint = ""
     if image_size:
@@ -414,9 +448,7 @@ def find_file_card_downloads(
 
     Coordinates are relative to the screenshot image.
     """
-    from openai import OpenAI
-
-    client = OpenAI(base_url=base_url, api_key=api_key)
+    client = _get_client(base_url, api_key)
 
     size_hint = ""
     if image_size:
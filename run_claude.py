@@ -108,7 +108,7 @@ def _process_group(
     before = _snapshot_dir(download_dir)
 
     # Files already in dedup for this group (skip re-downloading)
-    already = set(dedup.get_downloaded_for_group(group_name))
+    already = dedup.get_downloaded_set(group_name)
     log.info("Already downloaded for '%s': %d files", group_name, len(already))
 
     # Track coords seen this run to avoid double-clicking same button
@@ -180,21 +180,22 @@ def _process_group(
 
     # ── Step 5: Move to GDrive + record dedup (programmatic) ─
     moved = 0
-    for fpath in new_files:
-        if dedup.is_downloaded(group_name, fpath.name):
-            log.info("  skip (dedup, already moved): %s", fpath.name)
-            continue
-        try:
-            dest = move_file_to_gdrive(
-                file_path=fpath,
-                group_folder_name=group_alias,
-                gdrive_base_path=gdrive_base,
-            )
-            dedup.mark_downloaded(group_name, fpath.name, dest)
-            log.info("  moved: %s → %s", fpath.name, dest)
-            moved += 1
-        except Exception:
-            log.exception("  failed to move: %s", fpath.name)
+    with dedup.batch():
+        for fpath in new_files:
+            if dedup.is_downloaded(group_name, fpath.name):
+                log.info("  skip (dedup, already moved): %s", fpath.name)
+                continue
+            try:
+                dest = move_file_to_gdrive(
+                    file_path=fpath,
+                    group_folder_name=group_alias,
+                    gdrive_base_path=gdrive_base,
+                )
+                dedup.mark_downloaded(group_name, fpath.name, dest)
+                log.info("  moved: %s → %s", fpath.name, dest)
+                moved += 1
+            except Exception:
+                log.exception("  failed to move: %s", fpath.name)
 
     return moved
 
@@ -360,6 +361,10 @@ def main() -> None:
             model=agent_model,
             log_dir=cfg.logging.dir,
             base_url=agent_base_url,
+            screenshot_max_edge=cfg.claude.screenshot_max_edge,
+            screenshot_jpeg_quality=cfg.claude.screenshot_jpeg_quality,
+            capture_window_only=cfg.claude.capture_window_only,
+            window_class=cfg.dingtalk.window_class,
         )
         for group in cfg.groups:
             if only_group and group.name != only_group:
@@ -398,20 +403,21 @@ def main() -> None:
 
             new_files = get_new_files(cfg.dingtalk.download_dir, before)
             log.info("New files detected: %d", len(new_files))
-            for fpath in new_files:
-                if dedup.is_downloaded(group.name, fpath.name):
-                    log.info("  skip (dedup): %s", fpath.name)
-                    continue
-                try:
-                    dest = move_file_to_gdrive(
-                        file_path=fpath,
-                        group_folder_name=group.alias or group.name,
-                        gdrive_base_path=cfg.gdrive.base_path,
-                    )
-                    dedup.mark_downloaded(group.name, fpath.name, dest)
-                    log.info("  moved: %s → %s", fpath.name, dest)
-                except Exception:
-                    log.exception("  failed to move: %s", fpath.name)
+            with dedup.batch():
+                for fpath in new_files:
+                    if dedup.is_downloaded(group.name, fpath.name):
+                        log.info("  skip (dedup): %s", fpath.name)
+                        continue
+                    try:
+                        dest = move_file_to_gdrive(
+                            file_path=fpath,
+                            group_folder_name=group.alias or group.name,
+                            gdrive_base_path=cfg.gdrive.base_path,
+                        )
+                        dedup.mark_downloaded(group.name, fpath.name, dest)
+                        log.info("  moved: %s → %s", fpath.name, dest)
+                    except Exception:
+                        log.exception("  failed to move: %s", fpath.name)
 
         log.info("Autonomous mode complete.")
     else:
@@ -40,8 +40,8 @@ if not ctrl.open_files_tab():
     print("FAIL: Cannot open files tab")
     sys.exit(1)
 
-# Incremental scan — minimal scroll
-files = ctrl.list_files(max_scrolls=3)
+# Incremental scan — visible viewport only, no scrolling
+files = ctrl.list_files(scan_mode="top")
 print(f"Visible files: {len(files)}")
 
 if files: